@@ -0,0 +1,77 @@
+'''
+Checks that the Ruby registry stays flat: rebuilds and calculates a Merit order on a
+small synthetic scenario many times, reading its price curve and dispatchables, and
+samples the number of objects the Ruby registry keeps for the context. Every rebuild
+creates a new Merit::Order and hands proxies to Python, which are released again
+once they are collected.
+
+Use:
+    python benchmarks/registry.py [--iterations 10000] [--transport framed]
+'''
+import argparse
+import gc
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Allow "import vendor.rython" when run from the repository root
+sys.path.append(".")
+sys.path.append("benchmarks")
+
+from scenarios import write_scenario
+
+from vendor import rython
+from meurit.merit_order import MeritOrder, MeritOrderBuilder, ParticipantRecord
+from meurit.merit_order.source import Source
+
+# Number of times the registry size is sampled
+SAMPLES = 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the Ruby registry does not grow.')
+    parser.add_argument('--iterations', type=int, default=10000, help='rebuilds of the order')
+    parser.add_argument('--transport', choices=['xmlrpc', 'framed'], default='framed')
+    parser.add_argument('--requires', nargs='*', default=['bundler/setup', 'quintel_merit'],
+        help='Ruby libraries to load')
+    args = parser.parse_args()
+
+    context = rython.RubyContext(transport=args.transport, requires=args.requires)
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = Source(write_scenario(Path(directory), producers=10, users=2, flex=0, interconnectors=0))
+        order = MeritOrder(context)
+        MeritOrderBuilder(order, source).build_from_source()
+
+        sizes = []
+        start = time.perf_counter()
+
+        print(f'{"iteration":>10} {"registry size":>14} {"ms per iteration":>17}')
+
+        try:
+            for iteration in range(args.iterations):
+                participant = order.cached_participants()[0]
+                order.replace_participant_in_cache(
+                    ParticipantRecord(participant.constructor, dict(participant.attributes))
+                )
+                order.calculate()
+                order.price_curve()
+                order.dispatchables_at(iteration % 24)
+
+                if (iteration + 1) % max(args.iterations // SAMPLES, 1) == 0:
+                    gc.collect()
+                    sizes.append(context.registry_size())
+                    elapsed = (time.perf_counter() - start) * 1000 / (iteration + 1)
+                    print(f'{iteration + 1:>10} {sizes[-1]:>14} {elapsed:>17.2f}')
+        finally:
+            context.unload()
+
+    # By the first sample everything that is kept alive is registered
+    if sizes and max(sizes) > sizes[0]:
+        print(f'The registry grew from {sizes[0]} to {max(sizes[1:])} objects')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
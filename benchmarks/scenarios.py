@@ -0,0 +1,188 @@
+'''
+Synthetic scenarios for the benchmarks: sources of a configurable size, and areas of
+countries coupled by interconnectors. Everything is drawn from a seeded generator, so
+the same arguments always give the same scenario.
+'''
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Allow "import vendor.rython" when run from the repository root
+sys.path.append(".")
+
+from meurit.merit_order.dispatchables import DispatchablesMatrix
+from meurit.merit_order.source import LOCATIONS
+
+# Hours in the curves of a source, as Merit::POINTS
+POINTS = 8760
+
+# Different curve files, shared by the participants
+CURVES = 4
+
+
+def write_scenario(path, producers=100, users=10, flex=10, interconnectors=10, region='nl',
+        neighbours=('be',), seed=0):
+    '''
+    Writes the csv files and curves of a source to path
+
+    Params:
+        path(str|Path):         Folder of the source, created when missing
+        producers(int):         Number of producers, half of them must-run, half dispatchable
+        users(int):             Number of users
+        flex(int):              Number of flex participants, generic and storage
+        interconnectors(int):   Number of interconnectors from region to the neighbours
+        region(str):            Region of the source
+        neighbours(tuple[str]): Regions the interconnectors lead to, in turn
+        seed(int):              Seed of the generator
+
+    Returns:
+        Path: the folder
+    '''
+    path = Path(path)
+    rng = np.random.default_rng(seed)
+
+    (path / 'load_profiles').mkdir(parents=True, exist_ok=True)
+    (path / 'availability_curves').mkdir(exist_ok=True)
+
+    for index in range(CURVES):
+        np.savetxt(path / 'load_profiles' / f'profile_{index}.csv', np.full(POINTS, 1 / POINTS / 3600))
+        np.savetxt(path / 'availability_curves' / f'curve_{index}.csv', np.ones(POINTS))
+
+    profiles = [f'load_profiles/profile_{index}.csv' for index in rng.integers(0, CURVES, max(producers, users))]
+    always_on = np.arange(producers) % 2 == 0
+
+    pd.DataFrame({
+        'key': [f'{region}_producer_{index}' for index in range(producers)],
+        'type': np.where(always_on, 'MustRunProducer', 'DispatchableProducer'),
+        'path_to_load_profile': np.where(always_on, profiles[:producers], None),
+        'marginal_costs': rng.uniform(0, 150, producers),
+        'output_capacity_per_unit': rng.uniform(1, 1000, producers),
+        'number_of_units': rng.uniform(0, 10, producers),
+        'availability': rng.uniform(0.8, 1.0, producers),
+        'full_load_hours': np.where(always_on, rng.uniform(1000, 8000, producers), np.nan),
+    }, columns=[
+        'key', 'type', 'path_to_load_profile', 'marginal_costs', 'output_capacity_per_unit',
+        'number_of_units', 'availability', 'full_load_hours'
+    ]).to_csv(path / LOCATIONS['producers'], index=False)
+
+    pd.DataFrame({
+        'key': [f'{region}_user_{index}' for index in range(users)],
+        'path_to_load_profile': profiles[:users],
+        'total_consumption': rng.uniform(1e6, 1e9, users) * max(producers, 1) / max(users, 1),
+    }, columns=['key', 'path_to_load_profile', 'total_consumption']).to_csv(
+        path / LOCATIONS['users'], index=False
+    )
+
+    pd.DataFrame({
+        'key': [f'{region}_flex_{index}' for index in range(flex)],
+        'type': np.where(rng.random(flex) < 0.5, 'generic', 'storage'),
+        'marginal_costs': rng.uniform(0, 10, flex),
+        'input_capacity_per_unit': rng.uniform(1, 10, flex),
+        'output_capacity_per_unit': rng.uniform(1, 10, flex),
+        'number_of_units': rng.uniform(1, 10, flex),
+    }, columns=[
+        'key', 'type', 'marginal_costs', 'input_capacity_per_unit', 'output_capacity_per_unit',
+        'number_of_units'
+    ]).to_csv(path / LOCATIONS['flex'], index=False)
+
+    to_regions = [neighbours[index % len(neighbours)] for index in range(interconnectors)]
+
+    pd.DataFrame({
+        'key': [f'interconnector_{region}_{to}_{index}' for index, to in enumerate(to_regions)],
+        'from_region': region,
+        'to_region': to_regions,
+        'p_mw': rng.uniform(100, 1000, interconnectors),
+        'scaling': 1.0,
+        'in_service': True,
+        'marginal_costs': rng.uniform(0, 50, interconnectors),
+        'availability_curve': [
+            f'availability_curves/curve_{index}.csv' for index in rng.integers(0, CURVES, interconnectors)
+        ],
+    }, columns=[
+        'key', 'from_region', 'to_region', 'p_mw', 'scaling', 'in_service', 'marginal_costs',
+        'availability_curve'
+    ]).to_csv(path / LOCATIONS['interconnectors'], index=False)
+
+    return path
+
+
+def regions(countries):
+    '''Names of the regions of an area with the given number of countries'''
+    return [f'region_{index}' for index in range(countries)]
+
+
+def area_interconnectors(countries=4, interconnectors=6, seed=0):
+    '''
+    Interconnectors between the regions of an area in the format of the ExchangeModel:
+    a ring through all regions first, the others between random pairs
+
+    Returns:
+        pd.DataFrame
+    '''
+    rng = np.random.default_rng(seed)
+    names = regions(countries)
+    pairs = []
+
+    for index in range(interconnectors):
+        if index < countries:
+            pairs.append((names[index], names[(index + 1) % countries]))
+        else:
+            first, second = rng.choice(countries, 2, replace=False)
+            pairs.append((names[first], names[second]))
+
+    return pd.DataFrame({
+        'key': [f'interconnector_{index}' for index in range(interconnectors)],
+        'from_region': [pair[0] for pair in pairs],
+        'to_region': [pair[1] for pair in pairs],
+        'p_mw': rng.uniform(100, 1000, interconnectors),
+        'scaling': 1.0,
+        'in_service': True,
+    })
+
+
+class Zone:
+    '''
+    A country as the ExchangeModel sees it, with a generated supply stack instead of a
+    calculated Merit order
+
+    Params:
+        name(str):          Region of the zone
+        dispatchables(int): Number of dispatchables in the supply stack
+        hours(int):         Number of time steps, e.g. 8760 * 4 for quarter hours
+        seed(int):          Seed of the generator
+    '''
+
+    def __init__(self, name, dispatchables=50, hours=POINTS, seed=0):
+        rng = np.random.default_rng(seed)
+
+        self.name = name
+
+        marginal_costs = np.sort(rng.uniform(0, 150, dispatchables))
+        capacity = rng.uniform(10, 1000, dispatchables)
+        demand = rng.uniform(0.2, 0.9, hours) * capacity.sum()
+
+        served_before = np.cumsum(capacity) - capacity
+        load = np.clip(demand[:, None] - served_before[None, :], 0.0, capacity[None, :])
+
+        self.supply_stack = DispatchablesMatrix(
+            np.array([f'{name}_dispatchable_{index}' for index in range(dispatchables)]),
+            marginal_costs, capacity[None, :] - load, load
+        )
+
+        # The first dispatchable with capacity left sets the price
+        first = np.minimum((self.supply_stack.available_capacity > 0).argmax(axis=1), dispatchables - 1)
+        hours_index = np.arange(hours)
+
+        self.price_curve = pd.Series(marginal_costs[first], name=name)
+        self.available_capacity = pd.Series(self.supply_stack.available_capacity[hours_index, first], name=name)
+        self.available_plant = pd.Series(self.supply_stack.keys[first], name=name)
+
+
+def area_zones(countries=4, dispatchables=50, hours=POINTS, seed=0):
+    '''Generated Zones for all regions of an area'''
+    return [
+        Zone(name, dispatchables, hours, seed + index)
+        for index, name in enumerate(regions(countries))
+    ]
@@ -0,0 +1,89 @@
+'''
+Times reading a large Source: a generated scenario with 10k producers, users, flex
+and interconnectors (all sharing a few curve files), read with the columnar Source,
+from a bundle compiled from it, and with a row by row iterrows reader as a baseline.
+
+Use:
+    python benchmarks/source.py [--rows 10000] [--repeat 5]
+'''
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Allow "import vendor.rython" when run from the repository root
+sys.path.append(".")
+sys.path.append("benchmarks")
+
+from scenarios import write_scenario
+
+from meurit.merit_order.bundle import BundleSource, compile_source
+from meurit.merit_order.source import LOCATIONS, Source
+
+
+def read_columnar(source):
+    for location in ('producers', 'users', 'flex', 'interconnectors'):
+        for _ in getattr(source, location)():
+            pass
+
+
+def read_bundle(bundle):
+    '''Opens the bundle and reads all records, their curves are loaded with them'''
+    read_columnar(BundleSource(bundle))
+
+
+def read_rowwise(source):
+    '''The iterrows reader Source used before, as a baseline'''
+    for location in ('producers', 'users', 'flex', 'interconnectors'):
+        for _, row in pd.read_csv(source.path / LOCATIONS[location]).iterrows():
+            if not row['key'].startswith(':'):
+                row['key'] = f':{row["key"]}'
+
+            for key in ('path_to_load_profile', 'availability_curve'):
+                if key in row and isinstance(row[key], str):
+                    path = source.path / row[key]
+                    path.exists()
+                    row[key] = path
+
+            row.dropna().to_dict()
+
+
+def measure(function, source, repeat):
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(source)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reading a Source.')
+    parser.add_argument('--rows', type=int, default=10000, help='rows in each csv')
+    parser.add_argument('--repeat', type=int, default=5, help='reads per reader')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_scenario(Path(directory), args.rows, args.rows, args.rows, args.rows)
+        source = Source(Path(directory))
+        bundle = compile_source(source, Path(directory) / 'scenario.npz')
+
+        print(f'{"reader":<10} {"median s":>10} {"rows/s":>12}')
+
+        for name, function, argument in (
+            ('columnar', read_columnar, source),
+            ('bundle', read_bundle, bundle),
+            ('iterrows', read_rowwise, source),
+        ):
+            median = measure(function, argument, args.repeat)
+            print(f'{name:<10} {median:>10.3f} {4 * args.rows / median:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+'''
+Times how long a new RubyContext takes to answer its first call: starting a Ruby
+process (and loading the Merit gem) for each transport, and attaching to a running
+daemon. Each attach is what a new Python process pays once the daemon is up.
+
+Use:
+    python benchmarks/startup.py [--repeat 5] [--requires bundler/setup quintel_merit]
+'''
+import argparse
+import statistics
+import sys
+import time
+
+# Allow "import vendor.rython" when run from the repository root
+sys.path.append(".")
+
+from vendor import rython
+
+def measure(repeat, **context_kwargs):
+    '''
+    Creates repeat contexts and times their first call
+
+    Returns:
+        float: median time to the first result in ms
+    '''
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        context = rython.RubyContext(**context_kwargs)
+        context('1 + 1')
+        timings.append((time.perf_counter() - start) * 1000)
+        context.unload()
+
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark starting a Ruby context.')
+    parser.add_argument('--repeat', type=int, default=5, help='contexts per case')
+    parser.add_argument('--requires', nargs='*', default=['bundler/setup', 'quintel_merit'],
+        help='Ruby libraries to load')
+    args = parser.parse_args()
+
+    daemon = rython.RubyContext(transport='framed', requires=args.requires, daemon=True)
+    daemon.load()
+
+    print(f'{"case":<16} {"median ms":>10}')
+
+    try:
+        for case, kwargs in (
+            ('spawn xmlrpc', {'transport': 'xmlrpc'}),
+            ('spawn framed', {'transport': 'framed'}),
+            ('attach daemon', {'transport': 'framed', 'daemon': True}),
+        ):
+            median = measure(args.repeat, requires=args.requires, **kwargs)
+            print(f'{case:<16} {median:>10.1f}')
+    finally:
+        daemon.stop_daemon()
+
+
+if __name__ == '__main__':
+    main()
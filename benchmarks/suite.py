@@ -0,0 +1,315 @@
+'''
+Times the hot paths of meurit on synthetic scenarios (see benchmarks/scenarios.py) of
+a chosen size: reading a Source, building, calculating and rebuilding Merit orders,
+reading their dispatchables, and exchanging energy between countries. Results are
+written to JSON and compared against a stored baseline of the same size; cases that
+got slower than the tolerance allows are reported as regressions.
+
+The bridge cases time the calls to Ruby (round trips over each transport, curves as
+packed buffers, prepared snippets, and handing out and releasing proxies) on plain
+Ruby. The Merit order cases on Ruby need the Merit gem and are only run with --ruby.
+A case without a baseline fails the run, record one with --save-baseline. The exchange runs on
+sizes * resolution time steps, e.g. resolution 4 for quarter hours; sources always
+have hourly curves, as Merit has.
+
+Use:
+    python benchmarks/suite.py [--size small] [--ruby] [--output results.json]
+    python benchmarks/suite.py --size medium --save-baseline
+'''
+import argparse
+import datetime
+import gc
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Allow "import vendor.rython" when run from the repository root
+sys.path.append(".")
+sys.path.append("benchmarks")
+
+from scenarios import POINTS, area_interconnectors, area_zones, write_scenario
+
+from meurit.exchange import ExchangeModel
+from meurit.merit_order import MeritOrder, MeritOrderBuilder, NumpyMeritOrder, ParticipantRecord
+from meurit.merit_order.source import Source
+from vendor import rython
+
+BASELINE = Path(__file__).parent / 'baseline.json'
+
+SIZES = {
+    'small': {
+        'producers': 50, 'users': 5, 'flex': 10, 'interconnectors': 6,
+        'countries': 4, 'dispatchables': 25, 'resolution': 1,
+    },
+    'medium': {
+        'producers': 500, 'users': 50, 'flex': 100, 'interconnectors': 16,
+        'countries': 8, 'dispatchables': 100, 'resolution': 1,
+    },
+    'large': {
+        'producers': 5000, 'users': 500, 'flex': 1000, 'interconnectors': 40,
+        'countries': 16, 'dispatchables': 250, 'resolution': 4,
+    },
+}
+
+# Hours read with dispatchables_at in each repetition
+DISPATCHABLES_AT_HOURS = 24
+
+# Calls made to Ruby in each repetition of the bridge cases
+BRIDGE_CALLS = 20
+
+
+def measure(function, repeat, setup=None):
+    '''
+    Runs function repeat times, after setup when given
+
+    Returns:
+        dict: median and min in seconds
+    '''
+    timings = []
+
+    for _ in range(repeat):
+        argument = setup() if setup else None
+
+        start = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - start)
+
+    return {'median': statistics.median(timings), 'min': min(timings)}
+
+
+def read_source(source):
+    for location in ('producers', 'users', 'flex', 'interconnectors'):
+        for _ in getattr(source, location)():
+            pass
+
+
+def merit_order_cases(name, create, source, repeat):
+    '''
+    Times building, calculating, rebuilding after one participant changed, and reading
+    the dispatchables of Merit orders created by create
+
+    Returns:
+        dict[str, dict]: results by case
+    '''
+    def built():
+        order = create()
+        MeritOrderBuilder(order, source).build_from_source()
+        return order
+
+    def calculated():
+        order = built()
+        order.calculate()
+        return order
+
+    def changed():
+        order = calculated()
+        participant = order.cached_participants()[0]
+        order.replace_participant_in_cache(ParticipantRecord(participant.constructor, dict(participant.attributes)))
+        return order
+
+    def dispatchables_at(order):
+        for hour in range(DISPATCHABLES_AT_HOURS):
+            order.dispatchables_at(hour)
+
+    return {
+        f'{name}.build': measure(lambda _: built(), repeat),
+        f'{name}.calculate': measure(lambda order: order.calculate(), repeat, built),
+        f'{name}.rebuild': measure(lambda order: order.calculate(), repeat, changed),
+        f'{name}.dispatchables_at': measure(dispatchables_at, repeat, calculated),
+        f'{name}.dispatchables_matrix': measure(lambda order: order.dispatchables_matrix(), repeat, calculated),
+    }
+
+
+def bridge_cases(repeat):
+    '''
+    Times the Ruby bridge on each transport, without the Merit gem: round trips, a curve
+    sent back as a packed buffer, a prepared snippet called with a curve, and proxies
+    that are handed out and released again
+
+    Returns:
+        dict[str, dict]: results by case
+    '''
+    # Lists of floats travel as packed buffers
+    curve = [hour * 0.5 for hour in range(POINTS)]
+    results = {}
+
+    for transport in sorted(rython.TRANSPORTS):
+        context = rython.RubyContext(transport=transport, requires=[])
+        context.load()
+
+        def calls(_):
+            for _ in range(BRIDGE_CALLS):
+                context('1 + 1')
+
+        def prepared(_):
+            total = context.prepare('values.sum', 'values')
+
+            for _ in range(BRIDGE_CALLS):
+                total(curve)
+
+        def proxies(_):
+            handed_out = [context('Object.new') for _ in range(BRIDGE_CALLS)]
+            del handed_out
+            gc.collect()
+            context.release_proxies()
+
+        try:
+            results[f'bridge.{transport}.call'] = measure(calls, repeat)
+            results[f'bridge.{transport}.curve'] = measure(
+                lambda _: context(f'Rython.float64(Array.new({POINTS}) {{ |hour| hour * 0.5 }})'), repeat
+            )
+            results[f'bridge.{transport}.prepared'] = measure(prepared, repeat)
+            results[f'bridge.{transport}.proxies'] = measure(proxies, repeat)
+        finally:
+            context.unload()
+
+    return results
+
+
+def exchange_cases(size, repeat):
+    '''Times one exchange, per hour and saturated, between the countries of an area'''
+    hours = POINTS * size['resolution']
+    zones = area_zones(size['countries'], size['dispatchables'], hours)
+    interconnectors = area_interconnectors(size['countries'], size['interconnectors'])
+
+    results = {}
+
+    for name, saturate in (('exchange.step', False), ('exchange.saturate', True)):
+        model = ExchangeModel(interconnectors, saturate=saturate)
+        utilization = pd.DataFrame(0.0, index=range(hours), columns=interconnectors.index)
+
+        results[name] = measure(lambda _: model.exchange_energy(zones, utilization), repeat)
+
+    return results
+
+
+def run(size, repeat, ruby):
+    '''
+    Runs all cases on scenarios of the given size
+
+    Returns:
+        dict[str, dict]: results by case
+    '''
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The numpy backend does not do flex or interconnectors
+        numpy_source = Source(write_scenario(
+            Path(directory) / 'numpy', size['producers'], size['users'], flex=0, interconnectors=0
+        ))
+        ruby_source = Source(write_scenario(
+            Path(directory) / 'ruby', size['producers'], size['users'], size['flex'],
+            size['interconnectors']
+        ))
+
+        results['source.read'] = measure(lambda _: read_source(ruby_source), repeat)
+        results.update(merit_order_cases('numpy', NumpyMeritOrder, numpy_source, repeat))
+
+        if ruby:
+            results.update(merit_order_cases('ruby', MeritOrder, ruby_source, repeat))
+
+    results.update(bridge_cases(repeat))
+    results.update(exchange_cases(size, repeat))
+
+    return results
+
+
+def compare(results, baseline, tolerance, noise):
+    '''
+    Prints the results next to the baseline. Cases are compared on their fastest run,
+    which varies least between runs.
+
+    Returns:
+        tuple[list[str], list[str]]: the cases that are slower than the baseline by more
+                                     than tolerance and by more than noise seconds, and
+                                     the cases the baseline does not have
+    '''
+    regressions, missing = [], []
+
+    print(f'{"case":<30} {"min ms":>10} {"baseline ms":>12} {"change":>8}')
+
+    for case, result in results.items():
+        line = f'{case:<30} {result["min"] * 1000:>10.2f}'
+
+        if case in baseline:
+            change = result['min'] / baseline[case]['min'] - 1
+            line += f' {baseline[case]["min"] * 1000:>12.2f} {change:>+8.0%}'
+
+            if change > tolerance and result['min'] - baseline[case]['min'] > noise:
+                regressions.append(case)
+                line += '  REGRESSION'
+        else:
+            missing.append(case)
+            line += f' {"-":>12} {"-":>8}  NO BASELINE'
+
+        print(line)
+
+    return regressions, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark meurit on synthetic scenarios.')
+    parser.add_argument('--size', choices=SIZES, default='small', help='size of the scenarios')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case')
+    parser.add_argument('--ruby', action='store_true', help='also run the Ruby Merit order cases')
+    parser.add_argument('--output', type=Path, help='write the results to this JSON file')
+    parser.add_argument('--baseline', type=Path, default=BASELINE, help='JSON file with the baseline')
+    parser.add_argument('--save-baseline', action='store_true',
+        help='store the results as the baseline of the size')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+        help='slowdown (0.25 is 25%%) above which a case is a regression')
+    parser.add_argument('--noise', type=float, default=5.0,
+        help='slowdowns of less than this many ms are never regressions')
+
+    for name in SIZES['small']:
+        parser.add_argument(f'--{name}', type=int, help=f'override the {name} of the size')
+
+    args = parser.parse_args()
+
+    size = dict(SIZES[args.size])
+    size.update({name: getattr(args, name) for name in size if getattr(args, name) is not None})
+
+    results = run(size, args.repeat, args.ruby)
+
+    report = {
+        'size': args.size,
+        'parameters': size,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'results': results,
+    }
+
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    baseline = baselines.get(args.size, {})
+
+    if baseline.get('parameters', size) != size:
+        print(f'The baseline of {args.size} was run with other parameters, not comparing')
+        baseline = {}
+
+    regressions, missing = compare(results, baseline.get('results', {}), args.tolerance, args.noise / 1000)
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        baselines[args.size] = report
+        args.baseline.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+        print(f'Saved as the baseline of {args.size} in {args.baseline}')
+    elif regressions or missing:
+        if regressions:
+            print(f'{len(regressions)} regressions: {", ".join(regressions)}')
+        if missing:
+            print(f'{len(missing)} cases have no baseline of {args.size}, record one with '
+                  f'--save-baseline: {", ".join(missing)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''
+Compares the rython transports: round-trip latency and payload size for a
+small expression and for a full year (8760 values) float curve, both as an
+array and packed into a float64 buffer.
+
+Use:
+    python benchmarks/transport.py [--repeat 50]
+'''
+import argparse
+import statistics
+import sys
+import time
+
+# Allow "import vendor.rython" when run from the repository root
+sys.path.append(".")
+
+from vendor import rython
+
+CASES = {
+    'scalar': '1 + 1',
+    'curve': 'Array.new(8760) { |hour| hour * 0.5 }',
+    'packed': 'Rython.float64(Array.new(8760) { |hour| hour * 0.5 })',
+}
+
+def measure(transport, code, repeat):
+    '''
+    Evaluates code repeat times over the given transport
+
+    Returns:
+        tuple[float, float, int]: median and p95 latency in ms, bytes on the wire per call
+    '''
+    context = rython.RubyContext(transport=transport)
+    context.load()
+
+    try:
+        # Warm up the connection and the Ruby side
+        context(code)
+
+        sent, received = context.transport.bytes_sent, context.transport.bytes_received
+        timings = []
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            context(code)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        wire = (context.transport.bytes_sent - sent + context.transport.bytes_received - received)
+    finally:
+        context.unload()
+
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1], wire // repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the rython transports.')
+    parser.add_argument('--repeat', type=int, default=50, help='calls per case')
+    args = parser.parse_args()
+
+    print(f'{"case":<8} {"transport":<10} {"median ms":>10} {"p95 ms":>10} {"bytes/call":>12}')
+
+    for case, code in CASES.items():
+        for transport in sorted(rython.TRANSPORTS):
+            median, p95, wire = measure(transport, code, args.repeat)
+            print(f'{case:<8} {transport:<10} {median:>10.3f} {p95:>10.3f} {wire:>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+'''Running many scenarios at once, each worker process keeping a warm Ruby context'''
+import csv
+import glob
+import multiprocessing
+import multiprocessing.util
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import meurit.merit_order as merit_order
+from meurit.merit_order.builder import MeritOrderBuilder
+from meurit.merit_order.bundle import open_source
+from meurit.export import export_results, write_price_curve
+
+ScenarioResult = namedtuple(
+    'ScenarioResult',
+    ['name', 'source', 'status', 'seconds', 'build_seconds', 'calculate_seconds', 'error']
+)
+ScenarioResult.__doc__ = '''
+The outcome of one scenario of a batch, a row of its summary.
+
+Attributes:
+    name(str):                  name of the scenario, and of its output folder
+    source(str):                path of the source folder or bundle
+    status(str):                'ok' or 'failed'
+    seconds(float):             time from the start of the scenario until its output was written
+    build_seconds(float):       time spent reading the source and building the Merit order
+    calculate_seconds(float):   time spent calculating
+    error(str):                 the error of a failed scenario, empty otherwise
+'''
+
+SUMMARY = 'summary.csv'
+
+# A scenario that was running in a worker that died this many times is failed
+MAX_CRASHES = 2
+
+# Set in each worker, the queue on which it reports the scenarios it starts
+_started = None
+
+
+def run_scenario(source_path, to_path, backend='ruby', context=None, export=None):
+    '''
+    Builds and calculates the Merit order of one scenario, and writes its price curve
+    to to_path/price_curve.csv. With export, the load curves of all participants are
+    written as well, see export_results.
+
+    Params:
+        source_path(str|Path):  Folder with the CSVs, or a bundle compiled from them
+        to_path(str|Path):      Folder for the output, created when missing
+        backend(str):           The backend of the Merit order, see create_merit_order
+        context(RubyContext):   Optional, the Ruby context for the ruby backend
+        export(str):            Optional, the format of the load curves, one of FORMATS
+
+    Returns:
+        tuple[float, float]: build and calculate time in seconds
+    '''
+    start = time.perf_counter()
+
+    order = merit_order.create_merit_order(backend, context)
+    MeritOrderBuilder(order, open_source(source_path)).build_from_source()
+    built = time.perf_counter()
+
+    order.calculate()
+    calculated = time.perf_counter()
+
+    if export is not None:
+        export_results(order, to_path, export)
+    else:
+        to_path = Path(to_path)
+        to_path.mkdir(parents=True, exist_ok=True)
+        write_price_curve(order.price_curve(), to_path / 'price_curve.csv')
+
+    return built - start, calculated - built
+
+
+def expand_sources(patterns):
+    '''
+    Expands glob patterns into the source folders and bundles they match. Paths that
+    are not patterns are kept as they are, so that missing ones fail in the batch.
+
+    Returns:
+        list[Path]: sources in the given order, without duplicates
+    '''
+    sources = []
+
+    for pattern in patterns:
+        pattern = str(pattern)
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+
+        for match in matches:
+            if Path(match) not in sources:
+                sources.append(Path(match))
+
+    return sources
+
+
+def scenario_name(source_path):
+    '''Name of the output folder of a source: the folder name, or the bundle without extension'''
+    source_path = Path(source_path)
+    return source_path.stem if source_path.is_file() else source_path.name
+
+
+def run_batch(sources, to_path, workers=None, backend='ruby', on_result=None, export=None):
+    '''
+    Runs all sources over a pool of worker processes. Each worker starts its Ruby
+    context once and reuses it for every scenario it runs. Outputs are written to
+    to_path/<scenario name> as soon as a scenario finishes, and a row is added to
+    to_path/summary.csv. A failing scenario is recorded in the summary, the batch
+    carries on with the others.
+
+    Params:
+        sources(list[str|Path]):    Source folders or bundles, see expand_sources
+        to_path(str|Path):          Folder for the outputs and the summary
+        workers(int):               Number of worker processes, defaults to the number of CPUs
+        backend(str):               The backend of the Merit orders
+        on_result(callable):        Optional, called with each ScenarioResult when it comes in
+        export(str):                Optional, the format of the load curves, see run_scenario
+
+    Returns:
+        list[ScenarioResult]: in the order in which the scenarios finished
+    '''
+    to_path = Path(to_path)
+    to_path.mkdir(parents=True, exist_ok=True)
+
+    names = [scenario_name(source) for source in sources]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+
+    if duplicates:
+        raise ValueError(f'Scenario names must be unique, found {", ".join(duplicates)} more than once')
+
+    results = []
+
+    with open(to_path / SUMMARY, 'w', newline='') as summary_file:
+        summary = csv.writer(summary_file)
+        summary.writerow(ScenarioResult._fields)
+
+        def record(result):
+            results.append(result)
+            summary.writerow(result)
+            summary_file.flush()
+
+            if on_result is not None:
+                on_result(result)
+
+        pending = {name: str(source) for name, source in zip(names, sources)}
+        crashes = dict.fromkeys(names, 0)
+
+        while pending:
+            broken = _run_pending(pending, to_path, workers, backend, export, record)
+
+            # The scenarios that were running when a worker died may have caused it,
+            # they are given up after MAX_CRASHES. The others are run again.
+            for name, error in broken.items():
+                crashes[name] += 1
+
+                if crashes[name] >= MAX_CRASHES:
+                    record(ScenarioResult(name, pending.pop(name), 'failed', 0.0, 0.0, 0.0, repr(error)))
+
+    return results
+
+
+def _run_pending(pending, to_path, workers, backend, export, record):
+    '''
+    Runs the pending scenarios over a new pool of workers, recording and removing the
+    ones that finish. When a worker dies, e.g. because its Ruby process was killed,
+    the pool is broken and the scenarios left are kept pending.
+
+    Returns:
+        dict[str, BrokenProcessPool]: the error of each scenario that had started in a
+        worker of the broken pool, but did not finish
+    '''
+    mp_context = multiprocessing.get_context('spawn')
+    started = mp_context.SimpleQueue()
+    broken = {}
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp_context,
+        initializer=_start_worker,
+        initargs=(backend, started),
+    ) as executor:
+        futures = {
+            executor.submit(_run_in_worker, name, source, str(to_path / name), backend, export): name
+            for name, source in pending.items()
+        }
+
+        for future in as_completed(futures):
+            name = futures[future]
+
+            try:
+                outcome = future.result()
+            except BrokenProcessPool as error:
+                broken[name] = error
+                continue
+
+            record(ScenarioResult(name, pending.pop(name), *outcome))
+
+    running = set()
+
+    while not started.empty():
+        running.add(started.get())
+
+    # When none of them had started, the workers could not start at all
+    return {name: error for name, error in broken.items() if name in running} or broken
+
+
+def _start_worker(backend, started):
+    '''
+    Starts the Ruby context of a worker, it is stopped when the worker exits. Workers
+    are spawned, so each has a fresh merit_context of its own.
+    '''
+    global _started  # pylint: disable=global-statement
+    _started = started
+
+    if backend == 'ruby':
+        merit_order.merit_context.load()
+        multiprocessing.util.Finalize(None, merit_order.merit_context.unload, exitpriority=10)
+
+
+def _run_in_worker(name, source_path, to_path, backend, export=None):
+    '''
+    Runs one scenario in a worker, catching its errors. A Ruby context that died
+    during an earlier scenario is restarted first.
+
+    Returns:
+        tuple: status, seconds, build_seconds, calculate_seconds and error of the ScenarioResult
+    '''
+    _started.put(name)
+
+    if backend == 'ruby' and not merit_order.merit_context.is_alive():
+        merit_order.merit_context.reload()
+
+    start = time.perf_counter()
+
+    try:
+        build_seconds, calculate_seconds = run_scenario(source_path, to_path, backend, export=export)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except BaseException as error:  # pylint: disable=broad-except
+        # The errors of meurit are BaseExceptions as well
+        return ('failed', time.perf_counter() - start, 0.0, 0.0, f'{type(error).__name__}: {error}')
+
+    return ('ok', time.perf_counter() - start, build_seconds, calculate_seconds, '')
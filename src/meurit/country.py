@@ -1,35 +1,325 @@
-from meurit.merit_order import MeritOrder
-from meurit.merit_order import MeritOrderBuilder
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from meurit.exchange import ExchangeModel
+from meurit.merit_order import MeritOrderBuilder, create_merit_order
+
+# Columns of the interconnectors the ExchangeModel works with
+INTERCONNECTOR_COLUMNS = ['key', 'from_region', 'to_region', 'p_mw', 'scaling', 'in_service']
+
+# Timings (in seconds) and the largest change in interconnector utilization of one
+# iteration of Area.run
+AreaIteration = namedtuple(
+    'AreaIteration',
+    ['iteration', 'residual', 'calculate_time', 'exchange_time', 'inject_time']
+)
 
 
 class Country:
-    '''Represents one country, that is based on a single source'''
+    '''
+    Represents one country, that is based on a single source
 
-    def __init__(self, source):
-        self.merit_order = MeritOrder()
+    Params:
+        source(Source):         The source for the country
+        name(str):              Optional, defaults to the name of the source folder
+        context(RubyContext):   Optional, the Ruby context for the Merit order
+        backend(str):           'ruby' (default) or 'numpy', see create_merit_order
+    '''
+
+    def __init__(self, source, name=None, context=None, backend='ruby'):
+        self.merit_order = create_merit_order(backend, context)
         self.source = source
+        self.name = name or source.path.name
+        self._first_available = None
 
     def build_order(self):
         '''Use the builder to build up the Merit order'''
         MeritOrderBuilder(self.merit_order, self.source).build_from_source()
 
+    def calculate(self):
+        '''Calculates the Merit order, and forgets the previous price setting dispatchables'''
+        self.merit_order.calculate()
+        self._first_available = None
+
     def first_available_dispatchable_prices(self):
-        #  vraagt iets aan self.merit_order
-        pass
+        '''Marginal costs of the price setting dispatchable in each hour'''
+        return pd.Series(self._first_available_dispatchables().marginal_costs, name=self.name)
 
     def first_available_dispatchable_capacities(self):
-        #  vraagt iets aan self.merit_order
-        pass
+        '''Capacity left at the price setting dispatchable in each hour'''
+        return pd.Series(self._first_available_dispatchables().available_capacity, name=self.name)
 
     def first_available_dispatchable_keys(self):
-        pass
+        '''Key of the price setting dispatchable in each hour, None when there are none'''
+        index = self._first_available_dispatchables().index
+        # A missing dispatchable has index -1, which picks the None at the end
+        keys = np.append(self._dispatchable_keys.astype(object), None)
+        return pd.Series(keys[index], name=self.name)
+
+    @property
+    def supply_stack(self):
+        '''The dispatchables matrix of the calculated Merit order'''
+        self._first_available_dispatchables()
+        return self._supply_stack
 
-    def update_availability_curves(self):
-        '''update something on self.merit_order'''
+    # The hourly series the ExchangeModel uses for each zone
+    price_curve = property(first_available_dispatchable_prices)
+    available_capacity = property(first_available_dispatchable_capacities)
+    available_plant = property(first_available_dispatchable_keys)
+
+    def update_availability_curves(self, curves):
+        '''
+        Injects availability curves into the interconnectors of the Merit order. Curves
+        for participants that are not in this country are skipped.
+
+        Params:
+            curves(dict[str,np.ndarray]): Availability per hour for each participant key
+        '''
+        for key, values in curves.items():
+            if self.merit_order.get_participant_from_cache(key) is not None:
+                self.merit_order.inject_curve(key, values)
+
+    def _first_available_dispatchables(self):
+        '''
+        The price setting dispatchables of the calculated Merit order, retrieved once
+        per calculation
+        '''
+        if self._first_available is None:
+            matrix = self.merit_order.dispatchables_matrix()
+            self._supply_stack = matrix
+            self._dispatchable_keys = matrix.keys
+            self._first_available = self.merit_order.first_available_dispatchables(matrix)
+
+        return self._first_available
 
 class Area:
-    '''Keeps track of the area to be analysed, containing all countries'''
-    def __init__(self):
+    '''
+    Keeps track of the area to be analysed, containing all countries coupled by
+    their interconnectors
+
+    Params:
+        interconnectors(pd.DataFrame):  Optional, the interconnectors in the format of the
+                                        ExchangeModel. Defaults to those in the sources of
+                                        the countries.
+        pool(RubyContextPool):          Optional, when given each country is pinned to a
+                                        context of the pool and they are calculated in parallel.
+                                        The contexts are unpinned when a run is done.
+        tolerance(float):               Run stops when the utilization of no interconnector
+                                        changes more than this in any hour
+        max_iterations(int):            Run stops after this many iterations
+        saturate(bool):                 Exchange until no welfare is gained within each
+                                        iteration, see ExchangeModel
+        welfare_threshold(float):       Lowest welfare gain per unit that is exchanged
+                                        when saturating
+    '''
+    def __init__(self, interconnectors=None, pool=None, tolerance=1e-3, max_iterations=10,
+            saturate=False, welfare_threshold=0.0):
         self._countries = []
+        self._pinned = []
+        self._interconnectors = interconnectors
+        self.pool = pool
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.saturate = saturate
+        self.welfare_threshold = welfare_threshold
+
+        self.iterations = []
+        self.utilization = None
+        self.flows = None
+        self.exchange_prices = None
+
+    def add_country(self, source, name=None, backend='ruby'):
+        '''
+        Adds a country to the area and builds its Merit order
+
+        Params:
+            source(Source): The source for the country
+            name(str):      The region of the country in the interconnectors, defaults
+                            to the name of the source folder
+            backend(str):   The backend of its Merit order, see create_merit_order
+
+        Returns:
+            Country
+        '''
+        context = self.pool.pin() if self.pool and backend == 'ruby' else None
+
+        if context is not None:
+            self._pinned.append(context)
+
+        country = Country(source, name=name, context=context, backend=backend)
+        country.build_order()
+
+        self._countries.append(country)
+
+        return country
+
+    @property
+    def countries(self):
+        return list(self._countries)
+
+    @property
+    def converged(self):
+        '''Whether the last run stopped because the utilization settled'''
+        return bool(self.iterations) and self.iterations[-1].residual <= self.tolerance
+
+    def interconnectors(self):
+        '''
+        The in service interconnectors between countries in the area
+
+        Returns:
+            pd.DataFrame
+        '''
+        if self._interconnectors is not None:
+            frame = self._interconnectors
+        else:
+            rows = [row for country in self._countries for row in country.source.interconnectors()]
+            frame = pd.DataFrame(rows) if rows else pd.DataFrame(columns=INTERCONNECTOR_COLUMNS)
+            frame['key'] = frame['key'].str.lstrip(':')
+            frame = frame.drop_duplicates('key')
+
+        names = [country.name for country in self._countries]
+        inside = frame.from_region.isin(names) & frame.to_region.isin(names)
+
+        return frame[inside & frame.in_service.astype(bool)].reset_index(drop=True)
+
+    def run(self):
+        '''
+        Couples the countries: calculates all of them, exchanges energy between them and
+        injects the interconnector utilization back as availability, until the utilization
+        stops changing or max_iterations is reached. The countries are calculated once more
+        with the last utilization, that time counts towards the last iteration.
+
+        When the area has a pool, its contexts are unpinned afterwards. The countries keep
+        their context, later runs still calculate them in parallel.
+
+        Returns:
+            list[AreaIteration]: Timings and residual of each iteration
+        '''
+        interconnectors = self.interconnectors()
+        exchange = ExchangeModel(
+            interconnectors, saturate=self.saturate, welfare_threshold=self.welfare_threshold
+        )
+
+        self.iterations = []
+        self.utilization = None
+        self.flows = None
+
+        try:
+            for iteration in range(1, self.max_iterations + 1):
+                start = time.perf_counter()
+                self._calculate()
+                calculated = time.perf_counter()
+
+                if interconnectors.empty:
+                    # Nothing to exchange, the countries are independent
+                    self.iterations.append(AreaIteration(iteration, 0.0, calculated - start, 0.0, 0.0))
+                    break
+
+                if self.utilization is None:
+                    hours = len(self._countries[0].price_curve)
+                    self.utilization = pd.DataFrame(0.0, index=range(hours), columns=interconnectors.index)
+                    self.flows = self.utilization.copy()
+
+                self.exchange_prices, utilization = exchange(self._countries, self.utilization)
+                self.flows = self.flows + exchange.flows
+                exchanged = time.perf_counter()
+
+                residual = float(np.abs(utilization.to_numpy() - self.utilization.to_numpy()).max())
+                self.utilization = utilization
+
+                for country in self._countries:
+                    country.update_availability_curves(
+                        availability_curves(interconnectors, utilization, self.flows, country.name)
+                    )
+
+                self.iterations.append(AreaIteration(
+                    iteration, residual, calculated - start, exchanged - calculated,
+                    time.perf_counter() - exchanged
+                ))
+
+                if residual <= self.tolerance:
+                    break
+
+            if self.utilization is not None:
+                # The countries were calculated before the last utilization was
+                # injected, their prices and dispatchables have to follow it
+                start = time.perf_counter()
+                self._calculate()
+                self.iterations[-1] = self.iterations[-1]._replace(
+                    calculate_time=self.iterations[-1].calculate_time + time.perf_counter() - start
+                )
+        finally:
+            self._unpin()
+
+        return self.iterations
+
+    def _unpin(self):
+        '''Hands the contexts the countries were pinned to back to the pool'''
+        for context in self._pinned:
+            self.pool.unpin(context)
+
+        self._pinned = []
+
+    def _calculate(self):
+        '''
+        Calculates all countries. When the area has a pool, the countries in a Ruby
+        context of the pool are calculated in parallel.
+        '''
+        pooled = [
+            country for country in self._countries
+            if self.pool and country.merit_order.context is not None
+        ]
+
+        futures = [
+            self.pool.submit(country.merit_order.context, _calculate_country, country)
+            for country in pooled
+        ]
+
+        for country in self._countries:
+            if country not in pooled:
+                _calculate_country(country)
+
+        for future in futures:
+            future.result()
+
+
+def _calculate_country(country):
+    '''Calculates the country and reads its price setting dispatchables'''
+    country.calculate()
+    country.first_available_dispatchable_prices()
+
+
+def availability_curves(interconnectors, utilization, flows, region):
+    '''
+    Turns the utilization of the interconnectors into availability curves for the import
+    and export participants of one region. In each hour the utilization is available to
+    the side the region trades on: when the net flow over an interconnector is positive
+    its from_region exports, otherwise it imports.
+
+    Params:
+        interconnectors(pd.DataFrame):  The interconnectors of the ExchangeModel
+        utilization(pd.DataFrame):      Utilization per hour for each interconnector
+        flows(pd.DataFrame):            Net flows per hour for each interconnector
+        region(str):                    The region
+
+    Returns:
+        dict[str,np.ndarray]: Availability curves by participant key
+    '''
+    curves = {}
+    flows = flows.reindex(columns=utilization.columns, fill_value=0.0)
+
+    for index, connector in interconnectors.iterrows():
+        if region not in (connector.from_region, connector.to_region):
+            continue
+
+        values = np.clip(utilization[index].to_numpy(dtype='f8'), 0.0, 1.0)
+        from_exports = flows[index].to_numpy() >= 0
+        exports = from_exports if region == connector.from_region else ~from_exports
+
+        curves[f'{connector.key}_export'] = np.where(exports, values, 0.0)
+        curves[f'{connector.key}_import'] = np.where(exports, 0.0, values)
 
-    # TODO: finish this class, and add interconnection between countries
+    return curves
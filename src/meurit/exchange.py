@@ -1,18 +1,53 @@
+from collections import namedtuple
+
 import numpy as np
 import pandas as pd
 
+from meurit.logger import warn
+
+ExchangePlan = namedtuple(
+    'ExchangePlan',
+    ['index', 'regions', 'from_index', 'to_index', 'p_mw', 'scaling', 'active']
+)
+ExchangePlan.__doc__ = """
+The interconnector topology as arrays, compiled once from the interconnectors
+dataframe. Arrays have an entry per interconnector (link), in dataframe order.
+
+Attributes:
+    index(pd.Index):            labels of the interconnectors
+    regions(list[str]):         included regions, sorted
+    from_index(np.ndarray):     (links,) position of the from_region in regions
+    to_index(np.ndarray):       (links,) position of the to_region in regions
+    p_mw(np.ndarray):           (links,) capacity
+    scaling(np.ndarray):        (links,) share of the capacity that can be utilized
+    active(np.ndarray):         (links,) powered and in service
+"""
+
+# Capacities and volumes below this (in MW) are treated as zero
+EPSILON = 1e-9
+
+
 class ExchangeModel:
 
     """make sure to validate interconnectors dataframe for
     specified format. (raise for negative powers)
 
-    validate market prices (8760 entries)"""
+    validate market prices (8760 entries)
+
+    By default each exchange moves one volume per hour, over the interconnector
+    with the highest price delta. With saturate=True an exchange keeps trading
+    within each hour, over any interconnector, while the welfare gain of the
+    next megawatt is above welfare_threshold and interconnector capacity and
+    production surplus remain. Prices then follow the supply stack of each
+    zone, which zones provide as supply_stack (a DispatchablesMatrix with load).
+
+    After each exchange, flows holds the net exchanged volume per hour and
+    interconnector, positive from the from_region to the to_region."""
 
     @property
     def regions(self):
         """included regions"""
-        keys = ['from_region', 'to_region']
-        return list(np.unique(self.interconnectors[keys]))
+        return list(self.plan.regions)
 
     @property
     def capacity_matrix(self):
@@ -40,37 +75,25 @@ class ExchangeModel:
 
         return matrix
 
-    def __init__(self, interconnectors):
+    def __init__(self, interconnectors, saturate=False, welfare_threshold=0.0,
+            max_rounds=1000):
         """class initialization"""
 
-        # set dataframe
+        # set dataframe and compile it once for the exchange
         self.interconnectors = interconnectors
+        self.plan = compile_plan(interconnectors)
+
+        # exchange settings
+        self.saturate = saturate
+        self.welfare_threshold = welfare_threshold
+        self.max_rounds = max_rounds
+
+        self.flows = None
 
     def __call__(self, countries, utilization):
         """call market to exchange at highest welfare potential"""
         return self.exchange_energy(countries, utilization)
 
-    def _lookup_coords(self, coords, frame, **kwargs):
-        """lookup function to get coordinate values from dataframe"""
-
-        # reindex frame with factorized coords
-        idx, cols = pd.factorize(coords)
-        values = frame.reindex(cols, axis=1)
-
-        # lookup values
-        values = values.to_numpy()
-        values = values[np.arange(len(values)), idx]
-
-        return pd.Series(values, index=frame.index, **kwargs)
-
-    def _get_interzonal_price_deltas(self, values, from_region, to_region):
-        """get price delta between two regions"""
-        return values[from_region].sub(values[to_region])
-
-    def _get_interzonal_exchange_prices(self, values, from_region, to_region):
-        """get exchange price between two regions"""
-        return values[[from_region, to_region]].min(axis=1)
-
     def get_avaialble_plants_per_zone(self, zones):
         """name of the rampable power plant during each hour
         of the year"""
@@ -102,118 +125,342 @@ class ExchangeModel:
         return pd.concat(prices, axis=1, keys=names)
 
     def get_price_deltas_per_zone(self, zones):
-        """get price deltas for each interconnector"""
-
-        # get prices
-        prices = self.get_exchange_prices_per_zone(zones)
-
-        # availability conditions
-        powered = self.interconnectors.p_mw > 0
-        in_service = self.interconnectors.in_service
-
-        # subset available interconnectors
-        interconns = self.interconnectors[powered & in_service]
-
-        # make dictonairy
-        frm, to = interconns.from_region, interconns.to_region
-        mapping = dict(zip(interconns.index, list(zip(frm, to))))
+        """get price deltas for each powered and in service interconnector"""
 
-        # evaluate price deltas for combinations
-        combs, func = mapping.values(), self._get_interzonal_price_deltas
-        deltas = [func(prices, frm, to) for frm, to in combs]
+        # evaluate price deltas on the plan
+        prices = self._get_price_matrix(zones)
+        deltas = price_deltas(self.plan, prices)[:, self.plan.active]
 
-        return pd.concat(deltas, axis=1, keys=mapping.keys())
+        return pd.DataFrame(deltas, index=self._hours(zones),
+            columns=self.plan.index[self.plan.active])
 
     def get_exchange_prices_per_interconnector(self, zones):
         """get exchange prices for each interconnector"""
 
-        # reference interconnectors
-        interconns = self.interconnectors
-        prices = self.get_exchange_prices_per_zone(zones)
+        # evaluate price on the plan
+        prices = exchange_prices(self.plan, self._get_price_matrix(zones))
 
-        # make diconairy
-        frm, to = interconns.from_region, interconns.to_region
-        mapping = dict(zip(interconns.index, list(zip(frm, to))))
-
-        # evaluate price
-        combs, func = mapping.values(), self._get_interzonal_exchange_prices
-        prices = [func(prices, frm, to) for frm, to in combs]
-
-        return pd.concat(prices, axis=1, keys=mapping.keys())
+        return pd.DataFrame(prices, index=self._hours(zones), columns=self.plan.index)
 
     def get_available_capacity_per_interconnector(self, utilization):
         """determine wheter an interconnector is available to the
         market or is already fully utilized"""
 
         # determine remaining capacity
-        available = self.interconnectors.scaling.sub(utilization)
-        capacity = self.interconnectors.p_mw.mul(available)
+        capacity = available_capacity(self.plan, self._get_utilization_matrix(utilization))
 
-        return capacity
+        return pd.DataFrame(capacity, index=utilization.index, columns=self.plan.index)
 
     def make_exchange_table(self, zones, utilization):
         """make table with hourly exchange information"""
 
-        # determine price deltas and available capacity
-        deltas = self.get_price_deltas_per_zone(zones)
-        capacity = self.get_available_capacity_per_interconnector(utilization)
-
-        # drop exchange for saturated hours
-        deltas = deltas.mul(capacity > 0)
-
-        # get highest exchange potential
-        conns = deltas.abs().idxmax(axis=1)
-        df = conns.to_frame(name='node')
-
-        # lookup corresponding exchange prices
-        deltas = self._lookup_coords(conns, deltas)
-
-        # get region information
-        to_region = conns.map(self.interconnectors.to_region)
-        from_region = conns.map(self.interconnectors.from_region)
+        # select the exchange in each hour
+        prices = self._get_price_matrix(zones)
+        util = self._get_utilization_matrix(utilization)
+        node, delta, capacity = select_exchange(self.plan, prices, util)
 
         # assign exchange positions of regions
-        df['exporting_zone'] = np.where(deltas >= 0, from_region, to_region)
-        df['importing_zone'] = np.where(deltas >= 0, to_region, from_region)
+        hours = np.arange(len(node))
+        regions = np.asarray(self.plan.regions, dtype=object)
+        exporting, importing = exchange_zones(self.plan, node, delta)
+
+        df = pd.DataFrame({'node': self.plan.index[node]}, index=utilization.index)
+        df['exporting_zone'] = regions[exporting]
+        df['importing_zone'] = regions[importing]
 
         # lookup and assign capacity utilization and availability
-        df['utilization_percent'] = self._lookup_coords(conns, utilization)
-        df['available_mw'] = self._lookup_coords(conns, capacity)
+        df['utilization_percent'] = util[hours, node]
+        df['available_mw'] = capacity[hours, node]
 
         # assign welfare potential
-        df['welfare_per_unit'] = deltas.abs()
+        df['welfare_per_unit'] = np.abs(delta)
 
         return df
 
     def exchange_energy(self, zones, utilization):
-        """exchange energy between markets"""
+        """exchange energy between markets. The zones and utilization are read into
+        arrays once, the exchange itself runs on the compiled plan"""
 
         # copy utilization
-        utilization = utilization.copy(deep=True)
-
-        # get interconnector exchange prices and make table
-        exchange = self.make_exchange_table(zones, utilization)
-        surplus = self.get_production_surpluses_per_zone(zones)
+        util = self._get_utilization_matrix(utilization)
+        flows = np.zeros_like(util)
 
-        # lookup production surplus at exporting country
-        coords, name = exchange.exporting_zone, 'surplus_mw'
-        surplus = self._lookup_coords(coords, surplus, name=name)
+        if self.saturate:
+            stacks = SupplyStacks([self._get_supply_stack(zones, region)
+                for region in self.plan.regions])
 
-        # determine additional exchange volume
-        volume = np.minimum(surplus, exchange.available_mw)
+            if self.plan.active.any():
+                rounds = saturate_exchange(self.plan, stacks, util, flows,
+                    self.welfare_threshold, self.max_rounds)
 
-        # add additional utilization percentage
-        capacity = exchange.node.map(self.interconnectors.p_mw)
-        exchange.utilization_percent += volume.div(capacity)
+                if rounds >= self.max_rounds:
+                    warn(f'The exchange was stopped after {rounds} rounds, before all '
+                        'welfare gains were taken. Raise max_rounds to saturate it.')
 
-        # pivot utilization percent over interconnectors
-        columns, values = 'node', 'utilization_percent'
-        util = exchange.pivot(columns=columns, values=values)
+            prices = stacks.prices()
+        else:
+            prices = self._get_price_matrix(zones)
+            surplus = self._get_surplus_matrix(zones)
 
-        # update utilization tables
-        utilization.update(util)
+            if self.plan.active.any():
+                exchange_step(self.plan, prices, surplus, util, flows)
 
         # get interconnector price curves
-        iprices = self.get_exchange_prices_per_interconnector(zones)
+        iprices = exchange_prices(self.plan, prices)
+
+        index = utilization.index
+        self.flows = pd.DataFrame(flows, index=index, columns=self.plan.index)
+
+        return (pd.DataFrame(iprices, index=index, columns=self.plan.index),
+            pd.DataFrame(util, index=index, columns=self.plan.index))
+
+    def _hours(self, zones):
+        """index of the hourly curves of the zones"""
+        return zones[0].price_curve.index
+
+    def _get_price_matrix(self, zones):
+        """(hours, regions) array of the exchange prices of the zones"""
+        return self._get_region_matrix(zones, 'price_curve')
+
+    def _get_surplus_matrix(self, zones):
+        """(hours, regions) array of the production surpluses of the zones"""
+        return self._get_region_matrix(zones, 'available_capacity')
+
+    def _get_region_matrix(self, zones, attribute):
+        """stack a curve of each zone in the order of the plan regions"""
+        curves = {zone.name: getattr(zone, attribute) for zone in zones}
+        return np.column_stack([
+            np.asarray(curves[region], dtype=float) for region in self.plan.regions
+        ])
+
+    def _get_supply_stack(self, zones, region):
+        """the supply stack of the zone of the region"""
+        for zone in zones:
+            if zone.name == region:
+                stack = getattr(zone, 'supply_stack', None)
+
+                if stack is None or stack.load is None:
+                    raise ValueError(f'zone {region} has no supply stack to saturate the exchange')
+
+                return stack
+
+        raise KeyError(region)
+
+    def _get_utilization_matrix(self, utilization):
+        """(hours, links) copy of the utilization in the order of the plan"""
+        return utilization.reindex(columns=self.plan.index).to_numpy(dtype=float, copy=True)
+
+
+def compile_plan(interconnectors):
+    """compile the interconnectors dataframe into an ExchangePlan"""
+
+    keys = ['from_region', 'to_region']
+    regions = np.unique(interconnectors[keys])
+
+    return ExchangePlan(
+        index=interconnectors.index,
+        regions=list(regions),
+        from_index=np.searchsorted(regions, interconnectors.from_region.to_numpy()),
+        to_index=np.searchsorted(regions, interconnectors.to_region.to_numpy()),
+        p_mw=interconnectors.p_mw.to_numpy(dtype=float),
+        scaling=interconnectors.scaling.to_numpy(dtype=float),
+        active=(interconnectors.p_mw > 0).to_numpy() & interconnectors.in_service.to_numpy(dtype=bool),
+    )
+
+
+def price_deltas(plan, prices):
+    """(hours, links) price of the from_region minus that of the to_region"""
+    return prices[:, plan.from_index] - prices[:, plan.to_index]
+
+
+def exchange_prices(plan, prices):
+    """(hours, links) exchange price, the lowest price of both regions"""
+    return np.fmin(prices[:, plan.from_index], prices[:, plan.to_index])
+
+
+def available_capacity(plan, utilization):
+    """(hours, links) capacity that is not utilized yet"""
+    return (plan.scaling - utilization) * plan.p_mw
+
+
+def select_exchange(plan, prices, utilization):
+    """select the active interconnector with the highest welfare potential in each
+    hour, interconnectors without capacity left have no potential
+
+    Returns:
+        tuple[np.ndarray]: (hours,) selected link and its price delta, and the
+                           (hours, links) available capacity
+    """
+    capacity = available_capacity(plan, utilization)
+    deltas = price_deltas(plan, prices) * (capacity > 0)
+
+    potential = np.where(plan.active, np.abs(deltas), -np.inf)
+    node = potential.argmax(axis=1)
+
+    return node, deltas[np.arange(len(node)), node], capacity
+
+
+def exchange_zones(plan, node, delta):
+    """(hours,) exporting and importing region index of each selected link, the
+    cheaper region exports"""
+    from_exports = delta <= 0
+    frm, to = plan.from_index[node], plan.to_index[node]
+
+    return np.where(from_exports, frm, to), np.where(from_exports, to, frm)
+
+
+def exchange_step(plan, prices, surplus, utilization, flows):
+    """exchange energy over the selected interconnector in each hour, limited by the
+    production surplus at the exporting region
+
+    Params:
+        plan(ExchangePlan):         the compiled interconnectors
+        prices(np.ndarray):         (hours, regions) exchange prices
+        surplus(np.ndarray):        (hours, regions) production surpluses
+        utilization(np.ndarray):    (hours, links) utilization, updated in place
+        flows(np.ndarray):          (hours, links) net flows, updated in place
+
+    Returns:
+        np.ndarray: the utilization
+    """
+    hours = np.arange(len(utilization))
+
+    node, delta, capacity = select_exchange(plan, prices, utilization)
+    exporting, _ = exchange_zones(plan, node, delta)
+
+    # determine additional exchange volume and utilization
+    volume = np.minimum(surplus[hours, exporting], capacity[hours, node])
+    utilization[hours, node] += volume / plan.p_mw[node]
+    flows[hours, node] += np.where(exporting == plan.from_index[node], volume, -volume)
+
+    return utilization
+
+
+class SupplyStacks:
+    """the supply stacks of all regions during an exchange. Each stack is kept as the
+    cumulative capacity of its dispatchables in merit order, and the dispatched volume
+    of a region is moved along it as the region exports or imports"""
+
+    def __init__(self, stacks):
+        self.marginal_costs = [np.asarray(stack.marginal_costs, dtype=float) for stack in stacks]
+        self.cumulative = [
+            np.cumsum(stack.available_capacity + stack.load, axis=1) for stack in stacks
+        ]
+        self.dispatch = np.column_stack([stack.load.sum(axis=1) for stack in stacks])
+
+    def positions(self, hours=None):
+        """where each region is on its stack, as (hours, regions) arrays, for all
+        hours or only the given ones
+
+        Returns:
+            tuple[np.ndarray]: costs of the next megawatt it produces (inf when it
+                               has no capacity left) and the volume it can produce at
+                               those costs, costs of the last megawatt it produces (-inf
+                               when it produces nothing) and the volume it can give up
+                               at those costs
+        """
+        if hours is None:
+            hours = np.arange(self.dispatch.shape[0])
+
+        shape = (len(hours), self.dispatch.shape[1])
+        up_costs, headroom = np.full(shape, np.inf), np.zeros(shape)
+        down_costs, room = np.full(shape, -np.inf), np.zeros(shape)
+        rows = np.arange(shape[0])
+
+        for region, (costs, cumulative) in enumerate(zip(self.marginal_costs, self.cumulative)):
+            if not len(costs):
+                continue
+
+            cumulative = cumulative[hours]
+            dispatch = self.dispatch[hours, region]
+            last = len(costs) - 1
+
+            # the first dispatchable with capacity left produces the next megawatt
+            up = (cumulative <= dispatch[:, None] + EPSILON).sum(axis=1)
+            producing = up <= last
+            up = np.minimum(up, last)
+
+            up_costs[:, region] = np.where(producing, costs[up], np.inf)
+            headroom[:, region] = np.where(producing, cumulative[rows, up] - dispatch, 0.0)
+
+            # the dispatchable that holds the last megawatt gives it up first
+            down = np.minimum((cumulative < dispatch[:, None] - EPSILON).sum(axis=1), last)
+            below = np.where(down > 0, cumulative[rows, np.maximum(down - 1, 0)], 0.0)
+            dispatching = dispatch > EPSILON
+
+            down_costs[:, region] = np.where(dispatching, costs[down], -np.inf)
+            room[:, region] = np.where(dispatching, dispatch - below, 0.0)
+
+        return up_costs, headroom, down_costs, room
+
+    def prices(self):
+        """(hours, regions) price of each region: the costs of the first dispatchable
+        with capacity left, or of the last dispatchable"""
+        prices = np.full(self.dispatch.shape, np.nan)
+
+        for region, (costs, cumulative) in enumerate(zip(self.marginal_costs, self.cumulative)):
+            if len(costs):
+                up = (cumulative <= self.dispatch[:, region, None] + EPSILON).sum(axis=1)
+                prices[:, region] = costs[np.minimum(up, len(costs) - 1)]
+
+        return prices
+
+
+def saturate_exchange(plan, stacks, utilization, flows, threshold=0.0, max_rounds=1000):
+    """keep exchanging energy in all hours at once until no interconnector has a welfare
+    gain above the threshold. Each round moves, in every hour that still has a gain,
+    the volume over the best interconnector up to the next step in the supply stack of
+    the exporting or importing region, or until the interconnector is full. Hours are
+    independent, so an hour without a gain is left out of the later rounds.
+
+    Params:
+        plan(ExchangePlan):         the compiled interconnectors
+        stacks(SupplyStacks):       supply stacks of the regions, updated in place
+        utilization(np.ndarray):    (hours, links) utilization, updated in place
+        flows(np.ndarray):          (hours, links) net flows, updated in place
+        threshold(float):           lowest welfare gain per unit that is exchanged
+        max_rounds(int):            safeguard on the number of rounds
+
+    Returns:
+        int: the number of rounds, max_rounds when it stopped before all gains were taken
+    """
+    hours = np.arange(len(utilization))
+
+    for rounds in range(max_rounds):
+        up_costs, headroom, down_costs, room = stacks.positions(hours)
+        capacity = available_capacity(plan, utilization[hours])
+
+        # welfare gain of the next megawatt in both directions of each link
+        forward = down_costs[:, plan.to_index] - up_costs[:, plan.from_index]
+        backward = down_costs[:, plan.from_index] - up_costs[:, plan.to_index]
+
+        from_exports = forward >= backward
+        gain = np.where(from_exports, forward, backward)
+        gain = np.where(plan.active & (capacity > EPSILON), gain, -np.inf)
+
+        rows = np.arange(len(hours))
+        node = gain.argmax(axis=1)
+        trading = gain[rows, node] > threshold
+
+        if not trading.any():
+            return rounds
+
+        # only the hours that trade now can trade in the next round
+        rows, node, hours = rows[trading], node[trading], hours[trading]
+
+        from_exports = from_exports[rows, node]
+        frm, to = plan.from_index[node], plan.to_index[node]
+        exporting = np.where(from_exports, frm, to)
+        importing = np.where(from_exports, to, frm)
+
+        volume = np.minimum.reduce([
+            capacity[rows, node], headroom[rows, exporting], room[rows, importing]
+        ])
+
+        stacks.dispatch[hours, exporting] += volume
+        stacks.dispatch[hours, importing] -= volume
+
+        utilization[hours, node] += volume / plan.p_mw[node]
+        flows[hours, node] += np.where(from_exports, volume, -volume)
 
-        return iprices, utilization
+    return max_rounds
@@ -0,0 +1,145 @@
+'''Exporting the full results of a calculated Merit order: the price curve and the load of every participant'''
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from meurit.merit_order.curves import LOAD_CURVES_BLOCK
+
+FORMATS = ('npy', 'parquet', 'csv')
+
+# Hours written at once to parquet and csv
+ROWS_PER_CHUNK = 730
+
+
+def export_results(order, to_path, export_format='npy', block_size=LOAD_CURVES_BLOCK):
+    '''
+    Writes the results of a calculated Merit order to to_path:
+
+        price_curve.csv         the price curve, a value per line
+        participants.csv        the key of each column of the load curves
+        load_curves.<format>    the (hours, participants) float64 load of every participant
+
+    The load curves are read from the order in blocks of participants (see
+    MeritOrder.load_curves), and each block is written to a memory mapped .npy file
+    as it comes in, so only one block is in memory. Parquet and csv files are then
+    written from the .npy file, a chunk of hours at a time. Parquet needs pyarrow.
+
+    Params:
+        order(MeritOrder|NumpyMeritOrder):  The calculated order
+        to_path(str|Path):                  Folder for the output, created when missing
+        export_format(str):                 One of FORMATS
+        block_size(int):                    Number of participants read at once
+
+    Returns:
+        Path: the load curves file
+    '''
+    if export_format not in FORMATS:
+        raise ValueError(f'Unknown export format {export_format!r}, use one of {FORMATS}')
+
+    if export_format == 'parquet':
+        # Fail before reading anything from the order
+        _parquet_writer()
+
+    to_path = Path(to_path)
+    to_path.mkdir(parents=True, exist_ok=True)
+
+    write_price_curve(order.price_curve(), to_path / 'price_curve.csv')
+
+    keys = [participant.key.lstrip(':') for participant in order.cached_participants()]
+    pd.DataFrame({'key': keys}).to_csv(to_path / 'participants.csv', index_label='column')
+
+    loads_path = to_path / 'load_curves.npy'
+    write_load_curves(order.load_curves(keys, block_size), len(keys), loads_path)
+
+    if export_format == 'npy':
+        return loads_path
+
+    target = to_path / f'load_curves.{export_format}'
+    loads = np.load(loads_path, mmap_mode='r')
+
+    try:
+        if export_format == 'parquet':
+            _write_parquet(loads, keys, target)
+        else:
+            _write_csv(loads, keys, target)
+    finally:
+        del loads
+        os.unlink(loads_path)
+
+    return target
+
+
+def write_price_curve(price_curve, path):
+    '''Writes the price curve to a csv file, a value per line'''
+    with open(path, 'w') as f:
+        f.write('\n'.join(map(str, price_curve)))
+
+
+def write_load_curves(blocks, participants, path):
+    '''
+    Writes blocks of load curves to an (hours, participants) .npy file, column by column.
+    It is stored in Fortran order, so that each block is written contiguously.
+
+    Params:
+        blocks(Iterable[tuple[list[str], np.ndarray]]): keys and (hours, keys) loads of
+                                                        each block, see load_curves
+        participants(int):                              Number of participants in all blocks
+        path(Path):                                     The .npy file
+    '''
+    loads = None
+    column = 0
+
+    for keys, block in blocks:
+        if loads is None:
+            loads = np.lib.format.open_memmap(
+                path, mode='w+', dtype='<f8', shape=(block.shape[0], participants), fortran_order=True
+            )
+
+        loads[:, column:column + len(keys)] = block
+        column += len(keys)
+
+    if loads is None:
+        # No participants, there are no hours to go by either
+        np.save(path, np.zeros((0, 0)))
+        return
+
+    loads.flush()
+
+
+def _write_csv(loads, keys, path):
+    '''Writes the loads with a header of keys, a chunk of hours at a time'''
+    with open(path, 'w', newline='') as f:
+        for start in range(0, max(loads.shape[0], 1), ROWS_PER_CHUNK):
+            pd.DataFrame(loads[start:start + ROWS_PER_CHUNK], columns=keys).to_csv(
+                f, header=start == 0, index=False
+            )
+
+
+def _write_parquet(loads, keys, path):
+    '''Writes the loads with a column per key, a row group per chunk of hours'''
+    pa, parquet = _parquet_writer()
+    schema = pa.schema([(key, pa.float64()) for key in keys])
+
+    with parquet.ParquetWriter(path, schema) as writer:
+        for start in range(0, loads.shape[0], ROWS_PER_CHUNK):
+            chunk = loads[start:start + ROWS_PER_CHUNK]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(chunk[:, index]) for index in range(len(keys))], schema=schema
+            ))
+
+
+def _parquet_writer():
+    '''Returns pyarrow and pyarrow.parquet, which are only needed for parquet'''
+    try:
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet as parquet  # pylint: disable=import-outside-toplevel
+    except ImportError as error:
+        raise ExportFormatUnavailable('Exporting to parquet needs pyarrow, install it first') from error
+
+    return pa, parquet
+
+
+class ExportFormatUnavailable(BaseException):
+    '''The libraries needed for the export format are not installed'''
@@ -1,30 +1,61 @@
 import os
+from contextlib import contextmanager
 
 from vendor import rython
+from vendor.rython import calling_site
 from meurit.merit_order.builder import MeritOrderBuilder
-from meurit.merit_order.participants import Participants
+from meurit.merit_order.curve_cache import CURVE_CACHE, CURVE_CLASSES
+from meurit.merit_order.curves import Curves, RubyCurve
+from meurit.merit_order.dispatchables import Dispatchables, DispatchablesMatrix
+from meurit.merit_order.lock import Lock, MeritLockedException
+from meurit.merit_order.numpy_order import NumpyMeritOrder
+from meurit.merit_order.participants import ParticipantRecord, Participants
+from meurit.merit_order.ruby import (
+    ADD_PARTICIPANTS, convert_to_ruby_hash_string, is_path, participant_payload
+)
+
+# With RYTHON_DAEMON=true the Ruby process (and the gems it loaded) is shared by
+# all Python processes and kept running between them, see RubyContext
+merit_daemon = os.getenv('RYTHON_DAEMON') == 'true'
 
 merit_context = rython.RubyContext(
     requires=['bundler/setup', "quintel_merit"],
-    debug=os.getenv('DEBUG_RYTHON') == 'true'
+    debug=os.getenv('DEBUG_RYTHON') == 'true',
+    transport=os.getenv('RYTHON_TRANSPORT', 'framed' if merit_daemon else 'xmlrpc'),
+    daemon=merit_daemon,
+    socket_path=os.getenv('RYTHON_SOCKET')
 )
 
-class MeritOrder(Participants):
-    '''Sorta wraps the Ruby Merit gem'''
-    def __init__(self):
-        self.merit_order = merit_context("Merit::Order.new")
+class MeritOrder(Lock, Participants, Dispatchables, Curves):
+    '''
+    Sorta wraps the Ruby Merit gem
+
+    Params:
+        context(RubyContext): The Ruby context the order lives in, for example one pinned
+                              from a RubyContextPool. Defaults to the shared merit_context.
+    '''
+
+    # Curve files are read through this cache and sent to Ruby once per context. Set to
+    # None to have Ruby load the files itself.
+    curve_cache = CURVE_CACHE
+    def __init__(self, context=None):
+        self.context = context or merit_context
+        self.merit_order = self.context("Merit::Order.new")
+        self._generation = self.context.generation
         self._lock = False
+        self._batch = None
+        self.rebuilt_participants = 0
 
+    @calling_site
     def add_participant(self, participant='MustRunProducer', **kwargs):
         '''
         Adds a participant to the Merit Order (supply).
 
         See MO docs for all types of participants.
         '''
-        new_instance = f"{participant}.new({convert_to_ruby_hash_string(kwargs)})"
-        self._add(merit_context(new_instance))
-        self.cache_participant(new_instance)
+        self._add(ParticipantRecord(f'{participant}.new', kwargs))
 
+    @calling_site
     def add_user(self, **kwargs):
         '''
         Adds a User to the Merit order (demand).
@@ -35,160 +66,210 @@ class MeritOrder(Participants):
                     Required: key. Choose one of: total_consumption,
                     load_curve, consumption_share.
         '''
-        new_instance = f"Merit::User.create({convert_to_ruby_hash_string(kwargs)})"
-        self._add(merit_context(new_instance))
-        self.cache_participant(new_instance)
+        self._add(ParticipantRecord('Merit::User.create', kwargs))
 
     def _add(self, participant):
-        '''Add a Merit::Participant to the merit order'''
-        self.merit_order('add(%(new_participant)r)', new_participant=participant)
+        '''
+        Add a Merit::Participant to the merit order. Inside a batch the addition
+        is queued until the batch is done. The participant is cached once Ruby has it.
 
-    def calculate(self, auto_build=True):
-        '''Calculates the Merit Order based on the added participants'''
-        if not self.is_locked():
-            self.merit_order('calculate')
-            self.lock()
-        elif auto_build:
-            self.rebuild()
-            self.calculate()
+        Params:
+            participant(ParticipantRecord): The participant to add
+        '''
+        if self._batch is not None:
+            self._batch.append(participant)
         else:
-            raise MeritLockedException('The Merit order needs to be rebuilt before calulating')
+            self._add_all([participant])
 
-    def unlock(self):
-        '''Unlocks MO'''
-        self._lock = False
+    def _add_all(self, participants):
+        '''
+        Adds the participants to the Ruby merit order in a single call, see ADD_PARTICIPANTS.
+        They are sent as structured data, no Ruby source is generated for them.
 
-    def lock(self):
-        '''Locks the MO'''
-        self._lock = True
+        Each participant is created by its cached Ruby factory. When there is none, its
+        constructor and attributes are sent, and the factory Ruby makes from them is cached.
+        Only when the call succeeds are the participants cached, so that a failed batch
+        is not replayed by the next rebuild. Raises a ValueError, before anything is
+        sent, when a participant has the key of one that was added before.
 
-    def is_locked(self):
-        '''Check if MO is currently locked'''
-        return self._lock
+        Params:
+            participants(list[ParticipantRecord]): The participants to add, in order
+        '''
+        if not participants:
+            return
 
-    def rebuild(self):
-        '''Recreates the MO and all it's participants'''
-        self.merit_order = merit_context("Merit::Order.new")
-        for participant in self.cached_participants():
-            self._add(merit_context(participant))
+        # Ruby would keep both, but only one can be cached and rebuilt
+        self.check_unique_keys(participants)
 
-        self.unlock()
+        items = [
+            [participant.factory, '', '', {}] if participant.factory is not None
+            else ['', *participant_payload(participant.constructor, self._ruby_attributes(participant))]
+            for participant in participants
+        ]
 
-    def price_curve(self):
-        '''Returns the price curve'''
-        return self.merit_order('price_curve')('to_a')
+        factories = self.context.prepare(ADD_PARTICIPANTS, 'items').on(self.merit_order, items)
 
-    # TODO: Move all dispatchables methods to seperate file
-    def dispatchables_at(self, hour):
+        for participant, factory in zip(participants, factories):
+            if factory is not None:
+                participant.factory = factory
+                self.rebuilt_participants += 1
+
+            self.cache_participant(participant)
+
+    @contextmanager
+    def batch(self):
         '''
-        Returns the order of dispatchables in the given hour. Can only be called after calculate.
+        Context manager that queues all participants added inside it, and sends
+        them to the Ruby merit order in a single call when it is exited.
 
-        Returns:
-            list[list[str, float, float]]: a list with all dispatchables ordered by
-                                           marginal costs (key, available capacity, marginal_costs)
+        Use:
+            with merit_order.batch():
+                merit_order.add_user(**user)
+                merit_order.add_participant(**producer)
+        '''
+        if self._batch is not None:
+            # Already batching, the outer batch sends everything
+            yield
+            return
+
+        self._batch = []
+
+        try:
+            # Participants are sent when the batch is done, count that as adding them
+            with self.context.site('MeritOrder.add_participant', fallback=True):
+                yield
+                self._add_all(self._batch)
+        finally:
+            self._batch = None
+
+    def _ruby_attributes(self, participant):
         '''
+        The attributes of the participant, with curves from the curve cache, and
+        RubyCurves replaced by their proxy
+        '''
+        attributes = {}
 
-        ruby_map = """
-        map do |disp|
-            if disp.is_a?(Merit::VariableDispatchableProducer)
-                total_capacity = disp.max_load_at(%(hour)r)
-            else
-                total_capacity = disp.available_output_capacity
-            end
+        for name, value in participant.attributes.items():
+            if self.curve_cache is not None and name in CURVE_CLASSES and is_path(value):
+                value = self.curve_cache.ruby_curve(value, CURVE_CLASSES[name])
 
-            [disp.key, total_capacity - disp.load_at(%(hour)r), disp.marginal_costs]
-        end
-        """
+            if isinstance(value, RubyCurve):
+                value = value.proxy_for(self.context)
 
-        return self.dispatchables()(ruby_map, hour=hour)
+            attributes[name] = value
 
-    def dispatchables(self):
-        '''Returns RubyProxy of dispatchables. Only makes sense after calculate is called'''
-        return self.merit_order('participants')('dispatchables')
+        return attributes
 
-    def first_available_dispatchable_at(self, hour):
+    @calling_site
+    def calculate(self, auto_build=True):
         '''
-        Returns the key, available capacity and marginal costs of the price setting dispatchable
-        in a tuple.
-        If none is available, returns the last dispatchable.
+        Calculates the Merit Order based on the added participants. When the Ruby context
+        was restarted since the order was built, it is rebuilt first.
+        '''
+        if self.is_stale():
+            self.rebuild()
+
+        if not self.is_locked():
+            self.merit_order('calculate')
+            self.lock()
+        elif auto_build:
+            self.rebuild()
+            self.calculate()
+        else:
+            raise MeritLockedException('The Merit order needs to be rebuilt before calulating')
 
-        Only call this after calling calculate at least once
+    def is_stale(self):
+        '''Check if the Ruby context was restarted, losing the Ruby side of the MO'''
+        return self._generation != self.context.generation
+
+    @calling_site
+    def rebuild(self):
         '''
-        for key, available_capacity, marginal_cost in self.dispatchables_at(hour):
-            dispatchable = (key, available_capacity, marginal_cost)
-            if available_capacity:
-                break
+        Recreates the MO and all it's participants. Only participants that were replaced
+        since the last build are evaluated from their source again, their number is kept
+        in rebuilt_participants.
+        '''
+        if self.is_stale():
+            # Nothing that was built before exists in Ruby anymore
+            for participant in self.cached_participants():
+                participant.factory = None
+            self._generation = self.context.generation
+
+        self.merit_order = self.context("Merit::Order.new")
+        self.rebuilt_participants = 0
 
-        return dispatchable
+        with self.batch():
+            for participant in self.cached_participants():
+                self._add(participant)
 
+        self.unlock()
+
+    @calling_site
     def inject_curve(self, interconnector_key, curve_values, curve_type='availability'):
         '''
-        Inject availability curves back into the interconnector for recalulation
+        Inject availability curves back into the interconnector for recalulation.
+
+        The values are sent to Ruby once as a packed float64 buffer and kept there as a
+        Merit::Curve (see RubyCurve), so rebuilding does not parse the values again.
 
         Params:
             interconnector_key(str): ...
-            availability_curve(list[float]): ...
+            availability_curve(list[float]|np.ndarray): ...
         '''
         participant = self.replace_value(
             self.get_participant_from_cache(interconnector_key),
             curve_type,
-            curve_values
+            RubyCurve(curve_values)
         )
 
         self.replace_participant_in_cache(participant)
 
     @classmethod
-    def from_source(cls, source):
+    def from_source(cls, source, context=None):
         '''
         Creates and builds a MeritOrder based on the supplied source
 
         Params:
-            source(Source): The source for the MeritOrder
+            source(Source):         The source for the MeritOrder
+            context(RubyContext):   Optional, the Ruby context for the MeritOrder
         '''
-        mo = cls()
+        mo = cls(context)
         MeritOrderBuilder(mo, source).build_from_source()
 
         return mo
 
-class MeritLockedException(BaseException):
-    '''Merit order has been locked and needs to be rebuilt before calculating'''
+    @staticmethod
+    def calculate_all(orders, pool):
+        '''
+        Calculates the orders concurrently, each as a job on the RubyContextPool context
+        it was created with. Orders sharing a context are calculated one after the other.
 
-# Helper functions -------------------------------------------------------------
+        Params:
+            orders(list[MeritOrder]):   Orders created with contexts pinned from the pool
+            pool(RubyContextPool):      The pool
+        '''
+        futures = [pool.submit(order.context, order.calculate) for order in orders]
 
-def convert_to_ruby_hash_string(dictionary):
-    '''Converts a Python dict to a Ruby hash syntax in a string'''
-    return ', '.join((convert_to_ruby_key_value_pair(k,v) for k,v in dictionary.items()))
+        for future in futures:
+            future.result()
 
 
-def convert_to_ruby_key_value_pair(key, value):
+def create_merit_order(backend='ruby', context=None):
     '''
-    Converts a Python key value pair into a Ruby syntax key value pair, paying
-    attention to the difference between symbol and string values.
+    Creates an empty Merit order
 
-    Returns
-        str: Ruby hash key value pair as a string
+    Params:
+        backend(str):           'ruby' for the Merit gem, 'numpy' to calculate in Python
+                                (see NumpyMeritOrder for what it supports)
+        context(RubyContext):   Optional, the Ruby context for the ruby backend
     '''
-    if key == 'load_profile':
-        return f'{key}: {load_profile(value)}'
-
-    if key == 'availability_curve':
-        return f'availability: {curve(value)}'
-
-    if isinstance(value, str) and value[0] != ':':
-        value = f"'{value}'"
-    elif value is True:
-        value = 'true'
-    elif value is False:
-        value = 'false'
-
-    return f'{key}: {value}'
+    if backend == 'ruby':
+        return MeritOrder(context)
 
+    if backend == 'numpy':
+        return NumpyMeritOrder()
 
-def load_profile(path):
-    '''Returns a str version of Ruby code for creating a load profile from a path'''
-    return f"Merit::LoadProfile.load('{path}')"
+    raise ValueError(f'Unknown Merit order backend {backend!r}, use one of {BACKENDS}')
 
 
-def curve(path):
-    '''Returns a str version of Ruby code for creating a curve from a path'''
-    return f"Merit::Curve.load_file('{path}')"
+BACKENDS = ('ruby', 'numpy')
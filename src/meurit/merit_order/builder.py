@@ -11,12 +11,14 @@ class MeritOrderBuilder:
     def build_from_source(self):
         '''
         Builds the Merit order.
-        The instance is filled with participants from the csvs in the Source
+        The instance is filled with participants from the csvs in the Source,
+        which are sent to Ruby in one batch
         '''
-        self._build_users()
-        self._build_producers()
-        self._build_flex()
-        self._build_interconnectors()
+        with self.merit_order.batch():
+            self._build_users()
+            self._build_producers()
+            self._build_flex()
+            self._build_interconnectors()
 
     def _build_users(self):
         for user in self.source.users():
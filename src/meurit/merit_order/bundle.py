@@ -0,0 +1,291 @@
+'''Compiling a Source into a single binary scenario bundle, and reading it back'''
+import hashlib
+import os
+import tempfile
+from pathlib import Path, PurePath
+
+import numpy as np
+
+import pandas as pd
+
+from meurit.merit_order.curve_cache import CURVE_CLASSES
+from meurit.merit_order.curves import RubyCurve
+from meurit.merit_order.source import CURVE_KEYS, LOCATIONS, Source
+
+# Bumped when the layout of the bundle changes
+BUNDLE_VERSION = 2
+
+
+def compile_source(source, target):
+    '''
+    Writes the source as a bundle: the validated participant tables as typed columns,
+    and every curve they refer to in one contiguous float64 array. The bundle records
+    a hash of the content of all csv and curve files. When target already holds a
+    bundle with the same hash, it is left as it is.
+
+    Params:
+        source(Source):     The source to compile
+        target(str|Path):   Path of the bundle, an uncompressed .npz file
+
+    Returns:
+        Path: the bundle
+    '''
+    target = Path(target)
+    frames = {location: source.frame(location) for location in LOCATIONS}
+
+    curve_paths = sorted({
+        value
+        for frame in frames.values()
+        for key in CURVE_KEYS if key in frame.columns
+        for value in frame[key] if isinstance(value, PurePath)
+    })
+    content_hash = source_hash(source, curve_paths)
+
+    if target.exists():
+        try:
+            if bundle_hash(target) == content_hash:
+                return target
+        except (InvalidBundleError, OSError, KeyError, ValueError):
+            pass
+
+    arrays = {
+        'meta/version': np.array(BUNDLE_VERSION),
+        'meta/hash': np.array(content_hash),
+        'meta/source_path': np.array(str(source.path)),
+    }
+
+    curve_index = {path: index for index, path in enumerate(curve_paths)}
+    curves = [np.loadtxt(path, dtype='<f8', ndmin=1) for path in curve_paths]
+
+    arrays['curves/names'] = np.array([str(path) for path in curve_paths], dtype=str)
+    arrays['curves/offsets'] = np.cumsum([0] + [len(curve) for curve in curves]).astype(np.int64)
+    arrays['curves/values'] = np.concatenate(curves) if curves else np.zeros(0, dtype='<f8')
+
+    for location, frame in frames.items():
+        arrays[f'{location}/columns'] = np.array(list(frame.columns), dtype=str)
+
+        for column in frame.columns:
+            present = frame[column].notna().to_numpy()
+            arrays[f'{location}/{column}/present'] = present
+
+            if column in CURVE_KEYS:
+                values = [curve_index.get(value, -1) for value in frame[column]]
+                arrays[f'{location}/{column}'] = np.array(values, dtype=np.int64)
+            else:
+                arrays[f'{location}/{column}'] = _column_array(frame[column], present)
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    handle, partial = tempfile.mkstemp(dir=target.parent, suffix='.partial')
+
+    with os.fdopen(handle, 'wb') as file:
+        np.savez(file, **arrays)
+
+    os.replace(partial, target)
+
+    return target
+
+
+def source_hash(source, curve_paths):
+    '''sha256 of the csv files of the source and the curve files they refer to'''
+    digest = hashlib.sha256()
+
+    for location in sorted(LOCATIONS):
+        digest.update(LOCATIONS[location].encode())
+        digest.update((source.path / LOCATIONS[location]).read_bytes())
+
+    for path in curve_paths:
+        digest.update(str(PurePath(path).relative_to(source.path)).encode())
+        digest.update(Path(path).read_bytes())
+
+    return digest.hexdigest()
+
+
+def bundle_hash(path):
+    '''The source hash recorded in a bundle, without reading the rest of it'''
+    with np.load(path, allow_pickle=False) as arrays:
+        return str(arrays['meta/hash'])
+
+
+def _column_array(column, present):
+    '''
+    Column values as a typed array. Text columns become strings; columns of booleans
+    with empty cells (object columns in pandas) are kept as booleans. The empty cells
+    get a filler value, they are left out by the present mask.
+    '''
+    if column.dtype.kind in 'biuf':
+        return column.to_numpy()
+
+    kept_values = column[present]
+
+    if len(kept_values) and all(isinstance(value, (bool, np.bool_)) for value in kept_values):
+        return np.array([bool(value) if kept else False for value, kept in zip(column, present)])
+
+    return np.array([str(value) if kept else '' for value, kept in zip(column, present)], dtype=str)
+
+
+class BundleSource:
+    '''
+    Reads a bundle written by compile_source, with the same interface as Source.
+    Curves are given as RubyCurves, shared by all participants referring to the same
+    curve file, so each is sent to a Ruby context once.
+
+    Params:
+        path(str|Path): Path to the bundle
+    '''
+
+    def __init__(self, path):
+        self.bundle_path = Path(path)
+
+        # Read at once, so the file is not kept open
+        with np.load(self.bundle_path, allow_pickle=False) as arrays:
+            self._arrays = {name: arrays[name] for name in arrays.files}
+
+        if 'meta/version' not in self._arrays or \
+                int(self._arrays['meta/version']) != BUNDLE_VERSION:
+            raise InvalidBundleError(f'{self.bundle_path} is not a bundle of version {BUNDLE_VERSION}')
+
+        self.hash = str(self._arrays['meta/hash'])
+
+        # The directory the bundle was compiled from, countries are named after it
+        self.path = Path(str(self._arrays['meta/source_path']))
+
+        self._curves = {}
+
+    def producers(self):
+        '''
+        Reads producers from the bundle
+
+        Returns:
+            Generator[dict]: producer settings
+        '''
+        yield from self._records('producers')
+
+    def users(self):
+        '''
+        Reads users from the bundle
+
+        Returns:
+            Generator[dict]: user settings
+        '''
+        yield from self._records('users')
+
+    def interconnectors(self):
+        '''
+        Reads interconnectors from the bundle
+
+        Returns:
+            Generator[dict]: interconnector settings
+        '''
+        yield from self._records('interconnectors')
+
+    def flex(self):
+        '''
+        Reads flex settings from the bundle
+
+        Returns:
+            Generator[dict]: flex settings
+        '''
+        yield from self._records('flex')
+
+    def frame(self, location):
+        '''
+        Reads a location as a whole, like Source.frame. Empty cells are NaN, curves
+        are given as RubyCurves instead of paths.
+
+        Params:
+            location(str): One of producers, users, interconnectors, flex
+
+        Returns:
+            pd.DataFrame: the clean rows
+        '''
+        columns, values, present = self._columns(location)
+
+        return pd.DataFrame(
+            {
+                column: pd.Series(column_values, dtype=object if column in CURVE_KEYS else None)
+                    .where(column_present)
+                for column, column_values, column_present in zip(columns, values, present)
+            },
+            columns=columns
+        )
+
+    def curve(self, index, ruby_class='Merit::Curve'):
+        '''
+        Returns the RubyCurve of a curve in the bundle
+
+        Params:
+            index(int):         Position of the curve in the bundle
+            ruby_class(str):    The Ruby class of the curve
+        '''
+        if (index, ruby_class) not in self._curves:
+            if 'values' not in self._curves:
+                self._curves['values'] = self._arrays['curves/values']
+                self._curves['offsets'] = self._arrays['curves/offsets']
+
+            start, end = self._curves['offsets'][index:index + 2]
+            self._curves[(index, ruby_class)] = RubyCurve(
+                self._curves['values'][start:end], ruby_class
+            )
+
+        return self._curves[(index, ruby_class)]
+
+    # Private ------------------------------------------------------------------
+
+    def _records(self, location):
+        '''
+        Generates the rows of a location as dicts, without the empty values
+
+        Returns:
+            Generator[dict]: parameters
+        '''
+        columns, values, present = self._columns(location)
+
+        for row_values, row_present in zip(zip(*values), zip(*present)):
+            yield {
+                column: value
+                for column, value, kept in zip(columns, row_values, row_present) if kept
+            }
+
+    def _columns(self, location):
+        '''
+        Reads the columns of a location, curves as RubyCurves
+
+        Returns:
+            tuple[list, list[list], list[list[bool]]]: the names, values and present
+            masks of the columns
+        '''
+        columns = [str(column) for column in self._arrays[f'{location}/columns']]
+        values, present = [], []
+
+        for column in columns:
+            column_values = self._arrays[f'{location}/{column}'].tolist()
+
+            if column in CURVE_KEYS:
+                ruby_class = CURVE_CLASSES[column]
+                column_values = [
+                    self.curve(index, ruby_class) if index >= 0 else None for index in column_values
+                ]
+
+            values.append(column_values)
+            present.append(self._arrays[f'{location}/{column}/present'].tolist())
+
+        return columns, values, present
+
+
+def open_source(path):
+    '''
+    Opens a scenario: a directory of csv files, or a bundle compiled from one
+
+    Returns:
+        Source|BundleSource
+    '''
+    path = Path(path)
+
+    if path.is_file():
+        return BundleSource(path)
+
+    return Source(path)
+
+
+class InvalidBundleError(BaseException):
+    '''The file is not a bundle that can be read'''
@@ -0,0 +1,232 @@
+'''A shared cache of the curves (load profiles, availability curves) read from csv files'''
+import getpass
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from meurit.merit_order.curves import RubyCurve
+
+# Ruby classes of the participant attributes that are curves
+CURVE_CLASSES = {
+    'load_profile': 'Merit::LoadProfile',
+    'availability_curve': 'Merit::Curve',
+}
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+CurveCacheStats = namedtuple('CurveCacheStats', ['hits', 'misses', 'evictions', 'entries', 'bytes'])
+CurveCacheStats.__doc__ = '''
+Attributes:
+    hits(int):      curves that were served without parsing their csv
+    misses(int):    csv files that were parsed
+    evictions(int): curves that were dropped to stay within max_bytes
+    entries(int):   curves in the cache
+    bytes(int):     size of the curves in the cache
+'''
+
+
+class CurveCache():
+    '''
+    Parses each curve csv once, and keeps its values as a read-only memory-mapped
+    float64 array in a .npy file. Curves are keyed by their path and the modification
+    time and size of the file, so an edited file is read again.
+
+    All participants referring to the same file get the same array. For the Ruby Merit
+    order they get the same RubyCurve, so the values are sent to each Ruby context once.
+
+    When the curves take up more than max_bytes, the least recently used ones are
+    dropped, together with their .npy files. Arrays that are still in use stay valid.
+
+    The directory may be shared by several processes, e.g. the workers of a batch. Each
+    time a curve is parsed, the .npy files of other processes and of earlier runs are
+    removed, oldest first, until the directory fits in max_bytes again. A file removed
+    by another process is parsed again.
+
+    Params:
+        directory(str|Path):    Where the .npy files are kept. Defaults to
+                                $MEURIT_CURVE_CACHE, or meurit-curves-<user> in the
+                                temp dir. Files left by an earlier run are reused.
+        max_bytes(int):         Size bound of the cache
+    '''
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory or default_directory())
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = self._bytes = 0
+
+    def get(self, path):
+        '''
+        Returns the values of the curve csv at path
+
+        Returns:
+            np.ndarray: read-only float64 values
+        '''
+        return self._entry(path)['values']
+
+    def ruby_curve(self, path, ruby_class='Merit::Curve'):
+        '''
+        Returns the RubyCurve for the curve csv at path, one per file and Ruby class
+
+        Params:
+            path(str|Path):     Path to the csv
+            ruby_class(str):    The Ruby class of the curve, e.g. Merit::LoadProfile
+        '''
+        entry = self._entry(path)
+
+        with self._lock:
+            if ruby_class not in entry['ruby_curves']:
+                entry['ruby_curves'][ruby_class] = RubyCurve(entry['values'], ruby_class)
+
+            return entry['ruby_curves'][ruby_class]
+
+    def stats(self):
+        '''Returns CurveCacheStats'''
+        with self._lock:
+            return CurveCacheStats(
+                self._hits, self._misses, self._evictions, len(self._entries), self._bytes
+            )
+
+    def clear(self):
+        '''Drops all curves and their .npy files'''
+        with self._lock:
+            while self._entries:
+                self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Private ------------------------------------------------------------------
+
+    def _entry(self, path):
+        key = self._key(path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return entry
+
+            npy_path = self.directory / f'{hashlib.sha1(repr(key).encode()).hexdigest()}.npy'
+
+            try:
+                values = np.load(npy_path, mmap_mode='r')
+                self._hits += 1
+                parsed = False
+            except FileNotFoundError:
+                self._misses += 1
+                values = self._parse(path, npy_path)
+                parsed = True
+
+            entry = {
+                'values': values,
+                'npy_path': npy_path,
+                'ruby_curves': {},
+            }
+
+            self._entries[key] = entry
+            self._bytes += entry['values'].nbytes
+
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._evict()
+
+            if parsed:
+                self._trim_directory()
+
+            return entry
+
+    def _key(self, path):
+        '''Absolute path, modification time and size of the file'''
+        path = Path(path).resolve()
+        stat = path.stat()
+
+        return (str(path), stat.st_mtime_ns, stat.st_size)
+
+    def _parse(self, path, npy_path):
+        '''
+        Parses the csv and writes its .npy file. Returns the values mapped from the
+        file, or the parsed values when another process removed the file already.
+        '''
+        values = np.loadtxt(path, dtype='<f8', ndmin=1)
+        self._write(npy_path, values)
+
+        try:
+            return np.load(npy_path, mmap_mode='r')
+        except FileNotFoundError:
+            values.flags.writeable = False
+            return values
+
+    def _write(self, npy_path, values):
+        '''Writes the .npy file next to its final place first, so readers never see half of it'''
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        handle, partial = tempfile.mkstemp(dir=self.directory, suffix='.partial')
+
+        with os.fdopen(handle, 'wb') as file:
+            np.save(file, values)
+
+        os.replace(partial, npy_path)
+
+    def _evict(self):
+        '''Drops the least recently used curve'''
+        _, entry = self._entries.popitem(last=False)
+
+        self._bytes -= entry['values'].nbytes
+        self._evictions += 1
+
+        # Mapped arrays of the file stay readable after it is removed
+        try:
+            entry['npy_path'].unlink()
+        except FileNotFoundError:
+            pass
+
+    def _trim_directory(self):
+        '''
+        Removes the .npy files of other processes and earlier runs, least recently
+        written first, until the directory fits in max_bytes
+        '''
+        own = {entry['npy_path'] for entry in self._entries.values()}
+        files = []
+
+        for npy_path in self.directory.glob('*.npy'):
+            try:
+                stat = npy_path.stat()
+            except FileNotFoundError:
+                continue
+
+            files.append((stat.st_mtime_ns, npy_path, stat.st_size))
+
+        size = sum(file_size for _, _, file_size in files)
+
+        for _, npy_path, file_size in sorted(files):
+            if size <= self.max_bytes:
+                break
+
+            if npy_path in own:
+                continue
+
+            try:
+                npy_path.unlink()
+            except FileNotFoundError:
+                pass
+
+            size -= file_size
+
+
+def default_directory():
+    '''$MEURIT_CURVE_CACHE, or a directory of the user in the temp dir'''
+    return os.getenv('MEURIT_CURVE_CACHE') or (
+        Path(tempfile.gettempdir()) / f'meurit-curves-{getpass.getuser()}'
+    )
+
+
+# Shared by all Merit orders
+CURVE_CACHE = CurveCache()
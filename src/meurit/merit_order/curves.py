@@ -0,0 +1,160 @@
+'''Retrieving curves from a calculated MeritOrder'''
+import os
+import tempfile
+import weakref
+
+import numpy as np
+
+from vendor.rython import calling_site
+
+# Participants whose load curves are read in one call by load_curves
+LOAD_CURVES_BLOCK = 64
+
+# Ruby snippet evaluated on the Merit order, packing the load curves of the participants
+# with the given keys one after the other
+LOAD_CURVES = """
+by_key = participants.each_with_object({}) { |participant, found| found[participant.key.to_s] = participant }
+
+Rython.float64(keys.flat_map do |key|
+    by_key.fetch(key) { raise ArgumentError, "no participant with key #{key}" }.load_curve.to_a
+end)
+"""
+
+class Curves():
+    '''
+    Reads curves from the Ruby Merit order as float64 numpy arrays. The values are
+    packed in Ruby and never pass through the transport as separate numbers.
+
+    Set curve_transfer to 'file' to have Ruby write the packed values to a temporary
+    file, which is then mapped into memory instead of being sent over the transport.
+    '''
+
+    curve_transfer = 'buffer'
+
+    @calling_site
+    def price_curve(self):
+        '''Returns the price curve'''
+        return self._curve('price_curve')
+
+    @calling_site
+    def load_curve(self, key):
+        '''
+        Returns the load curve of a participant
+
+        Params:
+            key(str): Key of the participant, with or without the leading colon
+        '''
+        return self._curve(
+            'participants.detect { |participant| participant.key.to_s == key }.load_curve',
+            key=key.lstrip(':')
+        )
+
+    def load_curves(self, keys=None, block_size=LOAD_CURVES_BLOCK):
+        '''
+        Generates the load curves of many participants, reading block_size of them from
+        Ruby in one call. Only one block is kept in memory.
+
+        Params:
+            keys(list[str]):    Keys of the participants, with or without the leading colon.
+                                Defaults to all participants, in the order they were added.
+            block_size(int):    Number of participants in a block
+
+        Returns:
+            Generator[tuple[list[str], np.ndarray]]: the keys of a block, and their
+                                                     (hours, keys) float64 load curves
+        '''
+        if keys is None:
+            keys = [participant.key for participant in self.cached_participants()]
+
+        for start in range(0, len(keys), block_size):
+            block = [key.lstrip(':') for key in keys[start:start + block_size]]
+
+            yield block, self.load_curves_block(block)
+
+    @calling_site
+    def load_curves_block(self, keys):
+        '''
+        Reads the load curves of the participants with the given keys in one call
+
+        Params:
+            keys(list[str]):    Keys of the participants, without the leading colon
+
+        Returns:
+            np.ndarray: the (hours, keys) float64 load curves
+        '''
+        values = np.frombuffer(self.context.prepare(LOAD_CURVES, 'keys').on(self.merit_order, keys), dtype='<f8')
+
+        return values.reshape(len(keys), -1).T
+
+    @calling_site
+    def demand_curve(self):
+        '''Returns the total demand of all users'''
+        return self._curve(
+            """
+            participants.users.each_with_object(Array.new(Merit::POINTS, 0.0)) do |user, demand|
+                user.load_curve.to_a.each_with_index { |load, hour| demand[hour] += load }
+            end
+            """
+        )
+
+    def _curve(self, expression, **arguments):
+        '''
+        Evaluates the expression on the Ruby merit order and reads the resulting curve. The
+        expression is prepared once per context (see RubyContext.prepare), the arguments
+        are passed to it as Ruby local variables of the same name.
+
+        Returns:
+            np.ndarray: float64 values, the array may be read-only
+        '''
+        params = tuple(arguments)
+
+        if self.curve_transfer == 'file':
+            handle, path = tempfile.mkstemp(suffix='.f64')
+            os.close(handle)
+
+            try:
+                self.context.prepare(f'Rython.write_float64(({expression}), path)', *params, 'path') \
+                    .on(self.merit_order, *arguments.values(), path)
+                # The mapping outlives the removed file
+                return np.memmap(path, dtype='<f8', mode='r')
+            finally:
+                os.unlink(path)
+
+        return np.frombuffer(
+            self.context.prepare(f'Rython.float64({expression})', *params).on(self.merit_order, *arguments.values()),
+            dtype='<f8'
+        )
+
+
+class RubyCurve():
+    '''
+    Curve values that are kept in Python and sent to each Ruby context only once, as a
+    packed float64 buffer. Used as a participant attribute, the participant refers to
+    the Ruby object of the context it is built in.
+    '''
+    __slots__ = ('values', 'ruby_class', '_proxies')
+
+    def __init__(self, values, ruby_class='Merit::Curve'):
+        self.values = np.ascontiguousarray(values, dtype='<f8')
+        self.ruby_class = ruby_class
+        # Keyed by the context itself, a new context can get the id of a collected one
+        self._proxies = weakref.WeakKeyDictionary()
+
+    def proxy_for(self, context):
+        '''
+        Returns the RubyProxy to this curve in the given context, sending the values when
+        the context does not have them yet, or was restarted since
+        '''
+        generation, proxy = self._proxies.get(context, (None, None))
+
+        if generation != context.generation or proxy is None:
+            proxy = context.evaluate_float64(f'{self.ruby_class}.new(values)', self.values.tobytes())
+            self._proxies[context] = (context.generation, proxy)
+
+        return proxy
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return f'<RubyCurve {self.ruby_class} ({len(self.values)} values)>'
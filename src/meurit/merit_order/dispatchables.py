@@ -0,0 +1,180 @@
+'''Querying the dispatchables of a calculated MeritOrder'''
+from collections import namedtuple
+
+import numpy as np
+
+from vendor.rython import calling_site
+
+DispatchablesMatrix = namedtuple(
+    'DispatchablesMatrix',
+    ['keys', 'marginal_costs', 'available_capacity', 'load'],
+    defaults=(None,)
+)
+DispatchablesMatrix.__doc__ = '''
+The dispatchables ordered by marginal costs, for every hour of the year. Together they
+form the supply stack of the Merit order.
+
+Attributes:
+    keys(np.ndarray[str]):                  (n,) keys of the dispatchables
+    marginal_costs(np.ndarray[float]):      (n,) their marginal costs
+    available_capacity(np.ndarray[float]):  (hours, n) capacity that was left unused
+    load(np.ndarray[float]):                (hours, n) capacity that was used, optional
+'''
+
+FirstAvailableDispatchables = namedtuple(
+    'FirstAvailableDispatchables',
+    ['index', 'available_capacity', 'marginal_costs']
+)
+FirstAvailableDispatchables.__doc__ = '''
+The price setting dispatchable in every hour of the year: the first dispatchable with
+capacity left, or the last dispatchable when none is available. When there are no
+dispatchables at all, index is -1 and the capacity and marginal costs are NaN.
+
+Attributes:
+    index(np.ndarray[int]):                 (hours,) index into DispatchablesMatrix.keys
+    available_capacity(np.ndarray[float]):  (hours,) capacity it has left
+    marginal_costs(np.ndarray[float]):      (hours,) its marginal costs
+'''
+
+# Ruby snippets evaluated on the Merit order, prepared once per context
+DISPATCHABLES_AT = """
+participants.dispatchables.map do |disp|
+    if disp.is_a?(Merit::VariableDispatchableProducer)
+        total_capacity = disp.max_load_at(hour)
+    else
+        total_capacity = disp.available_output_capacity
+    end
+
+    [disp.key, total_capacity - disp.load_at(hour), disp.marginal_costs]
+end
+"""
+
+DISPATCHABLES_MATRIX = """
+keys, marginal_costs, capacity, load = [], [], [], []
+
+participants.dispatchables.each do |disp|
+    variable = disp.is_a?(Merit::VariableDispatchableProducer)
+
+    keys.push(disp.key.to_s)
+    marginal_costs.push(disp.marginal_costs.to_f)
+
+    Merit::POINTS.times do |hour|
+        total_capacity = variable ? disp.max_load_at(hour) : disp.available_output_capacity
+        hour_load = disp.load_at(hour).to_f
+
+        capacity.push(total_capacity - hour_load)
+        load.push(hour_load)
+    end
+end
+
+[keys, marginal_costs, Rython.float64(capacity), Rython.float64(load), Merit::POINTS]
+"""
+
+class Dispatchables():
+    '''Reads the dispatchables of the Ruby Merit order, after it was calculated'''
+
+    @calling_site
+    def dispatchables_at(self, hour):
+        '''
+        Returns the order of dispatchables in the given hour. Can only be called after calculate.
+        In hours past the end of the year nothing is dispatched, see validate_hour.
+
+        Returns:
+            list[list[str, float, float]]: a list with all dispatchables ordered by
+                                           marginal costs (key, available capacity, marginal_costs)
+        '''
+        return self.context.prepare(DISPATCHABLES_AT, 'hour').on(self.merit_order, validate_hour(hour))
+
+    @calling_site
+    def dispatchables_matrix(self):
+        '''
+        Returns the keys, marginal costs and available capacity of all dispatchables
+        for every hour of the year, in a single round trip. Can only be called after
+        calculate.
+
+        Returns:
+            DispatchablesMatrix: the dispatchables ordered by marginal costs
+        '''
+        keys, marginal_costs, capacity, load, hours = \
+            self.context.prepare(DISPATCHABLES_MATRIX).on(self.merit_order)
+
+        return DispatchablesMatrix(
+            np.array(keys, dtype=str),
+            np.array(marginal_costs, dtype=float),
+            np.frombuffer(capacity, dtype='<f8').reshape(len(keys), hours).T,
+            np.frombuffer(load, dtype='<f8').reshape(len(keys), hours).T
+        )
+
+    def dispatchables(self):
+        '''Returns RubyProxy of dispatchables. Only makes sense after calculate is called'''
+        return self.merit_order('participants')('dispatchables')
+
+    def first_available_dispatchables(self, matrix=None):
+        '''
+        Returns the price setting dispatchable for all hours at once, see
+        first_available_dispatchable_at. Only call this after calculate.
+
+        Params:
+            matrix(DispatchablesMatrix): Optional, an already retrieved dispatchables_matrix
+
+        Returns:
+            FirstAvailableDispatchables: aligned arrays with an entry for each hour
+        '''
+        return first_available(self.dispatchables_matrix() if matrix is None else matrix)
+
+    def first_available_dispatchable_at(self, hour):
+        '''
+        Returns the key, available capacity and marginal costs of the price setting dispatchable
+        in a tuple.
+        If none is available, returns the last dispatchable.
+
+        Only call this after calling calculate at least once
+        '''
+        for key, available_capacity, marginal_cost in self.dispatchables_at(hour):
+            dispatchable = (key, available_capacity, marginal_cost)
+            if available_capacity:
+                break
+
+        return dispatchable
+
+
+def validate_hour(hour):
+    '''
+    Returns the hour as an int. Negative hours raise a ValueError, instead of counting
+    back from the end of the year. Hours past the end are allowed: the Merit gem has
+    nothing dispatched in them, so all capacity is available.
+    '''
+    hour = int(hour)
+
+    if hour < 0:
+        raise ValueError(f'The hour cannot be negative, got {hour}')
+
+    return hour
+
+
+def first_available(matrix):
+    '''
+    Finds the first dispatchable with available capacity in each hour of the matrix.
+    When none has capacity left, the last dispatchable is used. Without dispatchables
+    every hour is missing, see FirstAvailableDispatchables.
+
+    Params:
+        matrix(DispatchablesMatrix): The dispatchables ordered by marginal costs
+
+    Returns:
+        FirstAvailableDispatchables
+    '''
+    available = matrix.available_capacity != 0
+    hours = np.arange(available.shape[0])
+
+    if available.shape[1] == 0:
+        missing = np.full(len(hours), np.nan)
+        return FirstAvailableDispatchables(np.full(len(hours), -1), missing, missing.copy())
+
+    index = np.where(available.any(axis=1), available.argmax(axis=1), available.shape[1] - 1)
+
+    return FirstAvailableDispatchables(
+        index,
+        matrix.available_capacity[hours, index],
+        matrix.marginal_costs[index]
+    )
@@ -0,0 +1,24 @@
+'''Locking a calculated Merit order until it is rebuilt'''
+
+class Lock():
+    '''
+    A calculated Merit order is locked: its participants have to be rebuilt before
+    it can be calculated again
+    '''
+    _lock = False
+
+    def unlock(self):
+        '''Unlocks MO'''
+        self._lock = False
+
+    def lock(self):
+        '''Locks the MO'''
+        self._lock = True
+
+    def is_locked(self):
+        '''Check if MO is currently locked'''
+        return self._lock
+
+
+class MeritLockedException(BaseException):
+    '''Merit order has been locked and needs to be rebuilt before calculating'''
@@ -0,0 +1,301 @@
+'''An in-process Merit order, dispatching all hours at once with NumPy'''
+from contextlib import contextmanager
+from pathlib import PurePath
+
+import numpy as np
+
+from meurit.merit_order.builder import MeritOrderBuilder
+from meurit.merit_order.curve_cache import CURVE_CACHE
+from meurit.merit_order.curves import LOAD_CURVES_BLOCK, RubyCurve
+from meurit.merit_order.dispatchables import Dispatchables, DispatchablesMatrix, validate_hour
+from meurit.merit_order.lock import Lock, MeritLockedException
+from meurit.merit_order.participants import ParticipantRecord, Participants
+
+# Hours in a year, as Merit::POINTS
+POINTS = 8760
+
+# Producers that run on their load profile or curve, whatever the demand
+ALWAYS_ON = ('MustRunProducer', 'VolatileProducer', 'CurveProducer')
+
+SUPPORTED_PRODUCERS = ALWAYS_ON + ('DispatchableProducer',)
+
+
+class NumpyMeritOrder(Lock, Participants, Dispatchables):
+    '''
+    A Merit order that is calculated in Python, without the Ruby Merit gem. Supports
+    users with a total consumption or a load curve, and MustRun, Volatile, Curve and
+    Dispatchable producers. Flex and interconnectors are not supported.
+
+    Dispatchables are sorted by marginal costs, and in each hour they serve the demand
+    that is left after the always-on producers, cheapest first. The price is set by the
+    first dispatchable with capacity left, or the last dispatchable when none is left.
+    '''
+
+    # There is no Ruby context, see MeritOrder
+    context = None
+
+    # Curve files are read through this cache, set to None to read them every time
+    curve_cache = CURVE_CACHE
+
+    def __init__(self):
+        self._dispatch = None
+
+    def add_participant(self, participant='MustRunProducer', **kwargs):
+        '''
+        Adds a producer to the Merit Order (supply).
+
+        Params:
+            participant(str): Type of producer, with or without Merit:: in front
+        '''
+        producer_type = participant.split('::')[-1]
+
+        if producer_type not in SUPPORTED_PRODUCERS:
+            raise UnsupportedParticipantError(
+                f'The numpy backend does not support {participant} ({kwargs.get("key")})'
+            )
+
+        self.cache_participant(ParticipantRecord(producer_type, kwargs))
+
+    def add_user(self, **kwargs):
+        '''
+        Adds a User to the Merit order (demand).
+
+        Params:
+            kwargs: Required: key, and total_consumption with a load_profile or a load_curve
+        '''
+        if 'consumption_share' in kwargs:
+            raise UnsupportedParticipantError(
+                f'The numpy backend does not support users with a consumption_share ({kwargs["key"]})'
+            )
+
+        self.cache_participant(ParticipantRecord('User', kwargs))
+
+    @contextmanager
+    def batch(self):
+        '''Participants are only read on calculate, so there is nothing to batch'''
+        yield
+
+    def calculate(self, auto_build=True):
+        '''Calculates the Merit Order based on the added participants'''
+        if not self.is_locked():
+            self._dispatch = self._calculate()
+            self.lock()
+        elif auto_build:
+            self.rebuild()
+            self.calculate()
+        else:
+            raise MeritLockedException('The Merit order needs to be rebuilt before calulating')
+
+    def rebuild(self):
+        '''Participants are read from the cache on each calculation, only unlocks the MO'''
+        self.unlock()
+
+    # Results ------------------------------------------------------------------
+
+    def price_curve(self):
+        '''Returns the price curve'''
+        return self.first_available_dispatchables().marginal_costs
+
+    def demand_curve(self):
+        '''Returns the total demand of all users'''
+        return self._calculated()['demand']
+
+    def load_curve(self, key):
+        '''
+        Returns the load curve of a participant
+
+        Params:
+            key(str): Key of the participant, with or without the leading colon
+        '''
+        return self._calculated()['loads'][key.lstrip(':')]
+
+    def load_curves(self, keys=None, block_size=LOAD_CURVES_BLOCK):
+        '''
+        Generates the load curves of many participants, block_size at a time
+
+        Params:
+            keys(list[str]):    Keys of the participants, with or without the leading colon.
+                                Defaults to all participants, in the order they were added.
+            block_size(int):    Number of participants in a block
+
+        Returns:
+            Generator[tuple[list[str], np.ndarray]]: the keys of a block, and their
+                                                     (hours, keys) float64 load curves
+        '''
+        if keys is None:
+            keys = [participant.key for participant in self.cached_participants()]
+
+        loads = self._calculated()['loads']
+
+        for start in range(0, len(keys), block_size):
+            block = [key.lstrip(':') for key in keys[start:start + block_size]]
+
+            yield block, np.column_stack([loads[key] for key in block])
+
+    def dispatchables_matrix(self):
+        '''
+        Returns the keys, marginal costs and available capacity of all dispatchables
+        for every hour of the year
+
+        Returns:
+            DispatchablesMatrix: the dispatchables ordered by marginal costs
+        '''
+        return self._calculated()['matrix']
+
+    def dispatchables_at(self, hour):
+        '''
+        Returns the order of dispatchables in the given hour. Can only be called after calculate.
+        In hours past the end of the year nothing is dispatched, as in the Merit gem.
+
+        Returns:
+            list[list[str, float, float]]: a list with all dispatchables ordered by
+                                           marginal costs (key, available capacity, marginal_costs)
+        '''
+        hour = validate_hour(hour)
+        matrix = self.dispatchables_matrix()
+
+        if hour < POINTS:
+            available = matrix.available_capacity[hour]
+        else:
+            # The capacity of a dispatchable is the same in every hour
+            available = matrix.available_capacity[0] + matrix.load[0]
+
+        return [
+            [str(key), float(capacity), float(marginal_costs)]
+            for key, capacity, marginal_costs
+            in zip(matrix.keys, available, matrix.marginal_costs)
+        ]
+
+    def dispatchables(self):
+        '''Returns the participant records of the dispatchables, ordered by marginal costs'''
+        return [self.get_participant_from_cache(key) for key in self.dispatchables_matrix().keys]
+
+    # Private ------------------------------------------------------------------
+
+    def _calculated(self):
+        if self._dispatch is None:
+            raise MeritNotCalculatedException('The Merit order needs to be calculated first')
+
+        return self._dispatch
+
+    def _calculate(self):
+        '''
+        Dispatches all hours at once
+
+        Returns:
+            dict: demand, loads of all participants by key, and the DispatchablesMatrix
+        '''
+        demand = np.zeros(POINTS)
+        always_on = np.zeros(POINTS)
+        loads = {}
+        dispatchables = []
+
+        for participant in self.cached_participants():
+            if participant.constructor == 'User':
+                loads[participant.key] = self._user_load(participant.attributes)
+                demand += loads[participant.key]
+            elif participant.constructor in ALWAYS_ON:
+                loads[participant.key] = self._always_on_load(participant.attributes)
+                always_on += loads[participant.key]
+            else:
+                dispatchables.append(participant)
+
+        # Stable, so dispatchables with the same costs keep the order they were added in
+        dispatchables.sort(key=lambda participant: participant.attributes['marginal_costs'])
+
+        keys = np.array([participant.key for participant in dispatchables], dtype=str)
+        marginal_costs = np.array(
+            [participant.attributes['marginal_costs'] for participant in dispatchables], dtype=float
+        )
+        capacity = np.array(
+            [available_output_capacity(participant.attributes) for participant in dispatchables],
+            dtype=float
+        )
+
+        # The demand each dispatchable sees is what is left after the cheaper ones
+        residual = np.maximum(demand - always_on, 0.0)
+        served_before = np.cumsum(capacity) - capacity
+        dispatched = np.clip(residual[:, None] - served_before[None, :], 0.0, capacity[None, :])
+
+        for index, key in enumerate(keys):
+            loads[key] = dispatched[:, index]
+
+        return {
+            'demand': demand,
+            'loads': loads,
+            'matrix': DispatchablesMatrix(keys, marginal_costs, capacity[None, :] - dispatched, dispatched),
+        }
+
+    def _user_load(self, attributes):
+        if 'load_curve' in attributes:
+            return self._read_curve(attributes['load_curve'])
+
+        return self._read_curve(attributes['load_profile']) * attributes['total_consumption']
+
+    def _always_on_load(self, attributes):
+        if 'load_curve' in attributes:
+            return self._read_curve(attributes['load_curve'])
+
+        return self._read_curve(attributes['load_profile']) * max_production(attributes)
+
+    def _read_curve(self, curve):
+        '''
+        Reads a curve given as a path, a list of values or a RubyCurve
+
+        Returns:
+            np.ndarray
+        '''
+        if isinstance(curve, RubyCurve):
+            return curve.values
+
+        if isinstance(curve, (str, PurePath)):
+            if self.curve_cache is None:
+                return np.loadtxt(curve, dtype=float, ndmin=1)
+            return self.curve_cache.get(curve)
+
+        return np.asarray(curve, dtype=float)
+
+    @classmethod
+    def from_source(cls, source):
+        '''
+        Creates and builds a NumpyMeritOrder based on the supplied source
+
+        Params:
+            source(Source): The source for the MeritOrder
+        '''
+        mo = cls()
+        MeritOrderBuilder(mo, source).build_from_source()
+
+        return mo
+
+
+def available_output_capacity(attributes):
+    '''Capacity of a producer, corrected for its availability, in MW'''
+    return (
+        attributes.get('output_capacity_per_unit', 0.0) *
+        attributes.get('number_of_units', 1.0) *
+        attributes.get('availability', 1.0)
+    )
+
+
+def max_production(attributes):
+    '''
+    Yearly production of an always-on producer in MJ. Availability is already part
+    of the full load hours.
+    '''
+    if 'full_load_hours' not in attributes:
+        return available_output_capacity(attributes) * POINTS * 3600
+
+    return (
+        attributes.get('output_capacity_per_unit', 0.0) *
+        attributes.get('number_of_units', 1.0) *
+        attributes['full_load_hours'] * 3600
+    )
+
+
+class UnsupportedParticipantError(BaseException):
+    '''The participant cannot be calculated by the numpy backend'''
+
+
+class MeritNotCalculatedException(BaseException):
+    '''Results were read before the Merit order was calculated'''
@@ -1,22 +1,77 @@
 '''Participants 'caching' for MeritOrder'''
-import re
+from meurit.merit_order.ruby import convert_to_ruby_hash_string, ruby_attribute_name
+
+class ParticipantRecord():
+    '''
+    The attributes needed to create one Merit::Participant. Ruby source is only
+    generated from it when the participant is built.
+
+    Attributes:
+        key(str):               Key of the participant, without the leading colon
+        constructor(str):       Ruby method creating the participant, e.g. Merit::User.create
+        attributes(dict):       Attributes passed to the constructor
+        factory(RubyProxy):     Ruby lambda creating the participant, None when it is not
+                                built yet or has changed since
+    '''
+    __slots__ = ('key', 'constructor', 'attributes', 'factory')
+
+    def __init__(self, constructor, attributes):
+        self.key = str(attributes['key']).lstrip(':')
+        self.constructor = constructor
+        self.attributes = attributes
+        self.factory = None
+
+    def to_ruby(self):
+        '''Returns the stringified Merit::Participant'''
+        return f'{self.constructor}({convert_to_ruby_hash_string(self.attributes)})'
+
+    def __repr__(self):
+        return f'<ParticipantRecord {self.to_ruby()}>'
 
 class Participants():
-    '''Cache the strigified objects needed to build up a Ruby Merit instance'''
+    '''
+    Cache the participant records needed to build up a Ruby Merit instance, indexed
+    by their key.
+
+    Next to each participant its factory is kept: a RubyProxy to a Ruby lambda that
+    creates the participant again. Replacing a participant drops its factory, marking
+    it as dirty.
+    '''
 
     def cached_participants(self):
         '''
-        List of stringified Merit::Participant instances, ready to be fed to a
-        merit_context
+        List of ParticipantRecords, in the order they were added, ready to be
+        built into a merit_context
         '''
-        return self._participants
+        return list(self._cached().values())
 
     def cache_participant(self, participant):
-        '''Add one user to the list'''
-        try:
-            self._participants.append(participant)
-        except AttributeError:
-            self._participants = [participant]
+        '''
+        Add one participant to the cache. Raises a ValueError when another participant
+        with its key was added before.
+
+        Params:
+            participant(ParticipantRecord): The participant
+        '''
+        self.check_unique_keys([participant])
+        self._cached()[participant.key] = participant
+
+    def check_unique_keys(self, participants):
+        '''
+        Raises a ValueError when a participant has the key of another one, in the cache
+        or among the participants. A participant that is in the cache itself passes.
+
+        Params:
+            participants(list[ParticipantRecord]): The participants about to be added
+        '''
+        cached = self._cached()
+        keys = set()
+
+        for participant in participants:
+            if participant.key in keys or cached.get(participant.key, participant) is not participant:
+                raise ValueError(f'A participant with key {participant.key} was already added')
+
+            keys.add(participant.key)
 
     def replace_participant_in_cache(self, new_participant):
         '''
@@ -24,52 +79,52 @@ class Participants():
         Raises a ValueError if no participant is found to replace
 
         Params:
-            new_participant(str): Stringified Merit:Participant
+            new_participant(ParticipantRecord): The participant replacing the old one
         '''
-        key = self._key_for(new_participant)
+        participants = self._cached()
 
-        for index, participant in enumerate(self._participants):
-            if self._key_for(participant) == key:
-                self._participants[index] = new_participant
-                break
-        else:
-            raise ValueError(f'Could not replace the participant with key {key}')
+        if new_participant.key not in participants:
+            raise ValueError(f'Could not replace the participant with key {new_participant.key}')
+
+        participants[new_participant.key] = new_participant
 
     def get_participant_from_cache(self, key):
         '''
         Returns a participant from the cache based on its key. Returns None if not found
         '''
-        for participant in self._participants:
-            if self._key_for(participant) == key:
-                return participant
-        return None
+        return self._cached().get(key.lstrip(':'))
 
     def replace_value(self, participant, key, new_value):
         '''
-        Replace the value that is currently under the key in the participant with a new value
+        Returns a copy of the participant, with the value that is currently under the key
+        replaced by a new value. The key may also be the name of the attribute in Ruby,
+        like 'availability' for an 'availability_curve'.
 
         Params:
-            participant(str):       Stringified version of a Merit::Participant
-            key(str):               The key to replace the value of
-            new_value(str|float):   The value to replace the old with
+            participant(ParticipantRecord): The participant
+            key(str):                       The key to replace the value of
+            new_value(Any):                 The value to replace the old with
         '''
-        merit_type, attributes = participant.split('(', 1)
-        attributes = attributes.split(', ')
-        # Remove the last bracket
-        attributes[-1] = attributes[-1][:-1]
-
-        for index, attribute in enumerate(attributes):
-            if attribute.startswith(key):
-                attributes[index] = f'{key}: {new_value}'
-                break
+        if key in participant.attributes:
+            attributes = dict(participant.attributes)
+            attributes[key] = new_value
         else:
-            raise KeyError('Key was not found in the participant')
+            attributes = {
+                (key if ruby_attribute_name(name) == key else name): value
+                for name, value in participant.attributes.items()
+            }
+            if key not in attributes:
+                raise KeyError('Key was not found in the participant')
 
-        return f'{merit_type}({", ".join(attributes)})'
+            attributes[key] = new_value
+
+        return ParticipantRecord(participant.constructor, attributes)
 
     # Private
 
-    def _key_for(self, participant):
-        '''Returns the participants key'''
-        pattern = r'key: :(_|[\da-zA-Z])+,'
-        return re.search(pattern, participant).group()[6:-1]
+    def _cached(self):
+        try:
+            return self._participants
+        except AttributeError:
+            self._participants = {}
+            return self._participants
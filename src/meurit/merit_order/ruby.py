@@ -0,0 +1,138 @@
+'''Helpers that write Ruby source for the Merit gem'''
+from pathlib import PurePath
+
+import numpy as np
+
+# Python attribute names that are called differently in Ruby
+RUBY_ATTRIBUTE_NAMES = {
+    'availability_curve': 'availability',
+}
+
+# Ruby snippet evaluated on the Merit order, with items a list of participants as
+# [factory, class, method, attributes]. Participants with a factory (a RubyProxy to a
+# lambda) are created by it. For the others the attributes are converted as
+# convert_to_ruby_hash_string would and a factory is made. All are added in one pass.
+# Returns the new factories, and nil for the participants that had one.
+ADD_PARTICIPANTS = """
+Rython::Items.new(items.map do |factory, class_name, method, attributes|
+    if factory.is_a?(Proc)
+        add(factory.call)
+        next nil
+    end
+
+    attributes = attributes.each_with_object({}) do |(key, value), converted|
+        key = key.to_sym
+        converted[key] =
+            if value.is_a?(String) && key == :load_profile
+                Merit::LoadProfile.load(value)
+            elsif value.is_a?(String) && key == :availability
+                Merit::Curve.load_file(value)
+            elsif value.is_a?(String) && value.start_with?(':')
+                value[1..-1].to_sym
+            else
+                value
+            end
+    end.freeze
+
+    constructor = Merit.const_get(class_name).method(method)
+    factory = -> { constructor.call(attributes.dup) }
+
+    add(factory.call)
+    factory
+end)
+"""
+
+
+def convert_to_ruby_hash_string(dictionary):
+    '''Converts a Python dict to a Ruby hash syntax in a string'''
+    return ', '.join((convert_to_ruby_key_value_pair(k,v) for k,v in dictionary.items()))
+
+
+def convert_to_ruby_key_value_pair(key, value):
+    '''
+    Converts a Python key value pair into a Ruby syntax key value pair, paying
+    attention to the difference between symbol and string values. Values that
+    live in Ruby (a RubyProxy) are referred to through the registry, curve
+    paths are loaded.
+
+    Returns
+        str: Ruby hash key value pair as a string
+    '''
+    if hasattr(value, 'ruby_context_address'):
+        return f'{ruby_attribute_name(key)}: {ruby_reference(value)}'
+
+    if key == 'load_profile' and is_path(value):
+        return f'{key}: {load_profile(value)}'
+
+    if key == 'availability_curve' and is_path(value):
+        return f'availability: {curve(value)}'
+
+    key = ruby_attribute_name(key)
+
+    if isinstance(value, str) and value[0] != ':':
+        value = f"'{value}'"
+    elif value is True:
+        value = 'true'
+    elif value is False:
+        value = 'false'
+
+    return f'{key}: {value}'
+
+
+def is_path(value):
+    '''Whether the value is a path to a file'''
+    return isinstance(value, (str, PurePath))
+
+
+def ruby_attribute_name(key):
+    '''Returns the name of the attribute in the Ruby participant'''
+    return RUBY_ATTRIBUTE_NAMES.get(key, key)
+
+
+def load_profile(path):
+    '''Returns a str version of Ruby code for creating a load profile from a path'''
+    return f"Merit::LoadProfile.load('{path}')"
+
+
+def curve(path):
+    '''Returns a str version of Ruby code for creating a curve from a path'''
+    return f"Merit::Curve.load_file('{path}')"
+
+
+def participant_payload(constructor, attributes):
+    '''
+    Returns the participant as plain values for ADD_PARTICIPANTS. Curve paths are loaded
+    in Ruby, values that live in Ruby are passed as their RubyProxy. The attributes (and
+    any curves loaded for them) are evaluated only once, by the factory made from them.
+
+    Params:
+        constructor(str):   Ruby method creating the participant, e.g. Merit::User.create
+        attributes(dict):   Attributes of the participant
+
+    Returns:
+        list: the Ruby class and method of the constructor, and the attributes by their
+              Ruby name
+    '''
+    class_name, method = constructor.rsplit('.', 1)
+
+    return [
+        class_name,
+        method,
+        {ruby_attribute_name(key): plain_value(value) for key, value in attributes.items()}
+    ]
+
+
+def plain_value(value):
+    '''Returns paths as str and numpy scalars as the Python value, so they can be sent'''
+    if isinstance(value, PurePath):
+        return str(value)
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    return value
+
+
+def ruby_reference(proxy):
+    '''Returns a str version of Ruby code referring to an object behind a RubyProxy'''
+    return f"Rython::registry.get_proxy({proxy.ruby_context_address!r})"
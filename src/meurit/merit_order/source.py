@@ -102,70 +102,114 @@ class Source:
                 f"{LOCATIONS[location]} could not be parsed: {exc}"
             ) from exc
 
-    def _clean_rows_from(self, location):
+    def frame(self, location):
         """
-        Generates clean rows from a location
+        Reads and validates a location as a whole. Keys get their leading colon, flex
+        types are converted to Merit participant types and curve paths are extended.
+        All problems in the file are reported at once.
 
         Params:
-            location(str): One of producers, users, interconnectors
+            location(str): One of producers, users, interconnectors, flex
 
         Returns:
-            Generator[dict]: parameters
+            pd.DataFrame: the clean rows
         """
-        yield from (
-            self._clean(row, location) for (_, row) in self._read(location).iterrows()
-        )
+        df = self._read(location)
+        errors = []
+
+        self._clean_keys(df, location, errors)
+
+        if location == "producers":
+            self._validate_producer_types(df, errors)
+        elif location == "flex":
+            self._set_flex_types(df, errors)
+
+        self._set_curves(df, errors)
 
-    def _clean(self, row, location):
+        if errors:
+            raise InvalidSourceError("\n".join(errors))
+
+        return df
+
+    def _clean_rows_from(self, location):
         """
-        Clean up and validate the csv row
+        Generates clean rows from a location
+
+        Params:
+            location(str): One of producers, users, interconnectors, flex
 
         Returns:
-            dict[str,Any]: the row converted to useable params
+            Generator[dict]: parameters, without the empty ones
         """
-        self._validate_key(row, location)
+        df = self.frame(location)
 
-        if location == "producers":
-            self._validate_producer_row(row)
-        elif location == "flex":
-            if row["type"] not in FLEX_TYPES:
-                raise InvalidSourceError(
-                    f'Flex type {row["type"]} is not supported ({LOCATIONS["flex"]}: {row["key"]})'
-                )
+        columns = list(df.columns)
+        present = df.notna().to_numpy()
 
-            row["type"] = FLEX_TYPES[row["type"]]
+        for values, keep in zip(df.to_numpy(dtype=object), present):
+            yield {
+                column: value for column, value, kept in zip(columns, values, keep) if kept
+            }
 
-        # if "load_profile" in row and isinstance(row["load_profile"], str):
-        self._set_curves(row)
+    def _clean_keys(self, df, location, errors):
+        """Checks for empty keys, and makes the others symbols"""
+        keys = df["key"].astype("string")
+        empty = keys.isna() | (keys.str.len() == 0)
 
-        return row.dropna().to_dict()
+        if empty.any():
+            errors.append(f'"key" cannot be empty ({LOCATIONS[location]})')
 
-    def _validate_key(self, row, location):
-        if not row["key"]:
-            raise InvalidSourceError(f'"key" cannot be empty ({LOCATIONS[location]})')
+        prefix = ~empty & ~keys.str.startswith(":").fillna(False)
+        df["key"] = keys.mask(prefix, ":" + keys).astype(object)
 
-        if not row["key"].startswith(":"):
-            row["key"] = f':{row["key"]}'
+    def _validate_producer_types(self, df, errors):
+        """Check if producer types are supported"""
+        invalid = ~df["type"].isin(VALID_PRODUCERS)
 
-    def _validate_producer_row(self, row):
-        """Check if producer type is supported"""
-        if not row["type"] in VALID_PRODUCERS:
-            raise InvalidSourceError(
-                f'Type should be one of {VALID_PRODUCERS} ({LOCATIONS["producers"]}: {row["key"]})'
+        if invalid.any():
+            errors.append(
+                f'Type should be one of {VALID_PRODUCERS} ({LOCATIONS["producers"]}: '
+                f'{self._list_keys(df, invalid)})'
+            )
+
+    def _set_flex_types(self, df, errors):
+        """Converts flex types to Merit participant types"""
+        invalid = ~df["type"].isin(FLEX_TYPES)
+
+        if invalid.any():
+            types = ", ".join(df["type"][invalid].astype(str).unique())
+            errors.append(
+                f'Flex type {types} is not supported ({LOCATIONS["flex"]}: '
+                f'{self._list_keys(df, invalid)})'
             )
 
-    def _set_curves(self, row):
+        df["type"] = df["type"].map(FLEX_TYPES).fillna(df["type"])
+
+    def _set_curves(self, df, errors):
         """
-        Extends curve paths, including path validation
+        Extends curve paths, including path validation. Each distinct path is checked
+        once.
 
         Params:
-            row(pd.Series): The row we're iterating over
+            df(pd.DataFrame): The rows of a location
         """
-        for key in (k for k in CURVE_KEYS if k in row and isinstance(row[k], str)):
-            lpf_path = self.path / row[key]
-            if not lpf_path.exists():
-                raise InvalidSourceError(f"{key} could not be located ({lpf_path})")
-            row[key] = lpf_path
+        for key in (k for k in CURVE_KEYS if k in df.columns):
+            named = df[key].map(lambda value: isinstance(value, str))
+
+            if not named.any():
+                continue
+
+            paths = {name: self.path / name for name in df[key][named].unique()}
+            missing = [str(path) for path in paths.values() if not path.exists()]
+
+            if missing:
+                errors.append(f"{key} could not be located ({', '.join(missing)})")
+
+            df[key] = df[key].astype(object)
+            df.loc[named, key] = df[key][named].map(paths)
+
+    def _list_keys(self, df, mask):
+        return ", ".join(df["key"][mask].astype(str))
 
 
 class MissingSourceError(BaseException):
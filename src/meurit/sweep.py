@@ -0,0 +1,159 @@
+'''Calculating one scenario for many samples of its parameters'''
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from meurit.merit_order import MeritOrderBuilder, ParticipantRecord, create_merit_order
+
+
+def sample_parameters(distributions, samples, seed=None):
+    '''
+    Draws samples of participant attributes. The same seed gives the same samples.
+
+    Params:
+        distributions(dict):    For each (participant key, attribute) either a (low, high)
+                                tuple to draw uniformly from, or a function of a
+                                np.random.Generator and the number of samples returning
+                                that many values
+        samples(int):           Number of samples
+        seed(int):              Seed of the random number generator
+
+    Returns:
+        list[dict[str, dict[str, float]]]: for each sample the attributes to change per
+                                           participant key, see Sweep.run
+    '''
+    rng = np.random.default_rng(seed)
+    drawn = []
+
+    for (key, attribute), distribution in distributions.items():
+        if callable(distribution):
+            values = np.asarray(distribution(rng, samples), dtype=float)
+        else:
+            values = rng.uniform(*distribution, samples)
+
+        drawn.append((key, attribute, values))
+
+    deltas = [{} for _ in range(samples)]
+
+    for key, attribute, values in drawn:
+        for delta, value in zip(deltas, values):
+            delta.setdefault(key, {})[attribute] = float(value)
+
+    return deltas
+
+
+class Sweep:
+    '''
+    Builds the Merit order of a source once, and calculates it for many samples of its
+    parameters. For each sample only the participants whose attributes change are
+    replaced, so a rebuild evaluates just those (see MeritOrder.rebuild).
+
+    Params:
+        source(Source):         The source of the scenario
+        backend(str):           The backend of the Merit orders, see create_merit_order
+        pool(RubyContextPool):  Optional, for the ruby backend. The order is built on each
+                                context of the pool, and samples are calculated on all
+                                of them at once.
+        workers(int):           For the numpy backend, the number of threads calculating
+                                samples, each with its own order
+    '''
+
+    def __init__(self, source, backend='ruby', pool=None, workers=1):
+        self.pool = pool if backend == 'ruby' else None
+
+        if self.pool is not None:
+            self.orders = [create_merit_order(backend, context) for context in self.pool.contexts]
+        else:
+            self.orders = [create_merit_order(backend) for _ in range(max(workers, 1) if backend == 'numpy' else 1)]
+
+        for order in self.orders:
+            MeritOrderBuilder(order, source).build_from_source()
+
+        self._originals = [
+            {participant.key: participant for participant in order.cached_participants()}
+            for order in self.orders
+        ]
+
+        self.orders[0].calculate()
+        self.baseline = np.array(self.orders[0].price_curve(), dtype=float)
+
+    def run(self, samples):
+        '''
+        Calculates the price curve for each sample. Afterwards the orders are back at
+        the attributes of the source.
+
+        Params:
+            samples(list[dict[str, dict[str, Any]]]):   For each sample the attributes to
+                                                        change per participant key, e.g. from
+                                                        sample_parameters
+
+        Returns:
+            np.ndarray: (samples, hours) price curves, in the order of the samples
+        '''
+        for delta in samples:
+            for key in delta:
+                if key.lstrip(':') not in self._originals[0]:
+                    raise KeyError(f'No participant with key {key} to change')
+
+        prices = np.empty((len(samples), len(self.baseline)))
+        chunks = [
+            (index, range(index, len(samples), len(self.orders)))
+            for index in range(min(len(self.orders), len(samples)))
+        ]
+
+        if self.pool is not None:
+            futures = [
+                self.pool.submit(self.orders[index].context, self._run_chunk, index, rows, samples, prices)
+                for index, rows in chunks
+            ]
+            for future in futures:
+                future.result()
+        elif len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+                for future in [executor.submit(self._run_chunk, index, rows, samples, prices) for index, rows in chunks]:
+                    future.result()
+        else:
+            for index, rows in chunks:
+                self._run_chunk(index, rows, samples, prices)
+
+        return prices
+
+    def _run_chunk(self, index, rows, samples, prices):
+        '''Calculates the samples in rows on one order, filling their rows of prices'''
+        order = self.orders[index]
+        originals = self._originals[index]
+        changed = set()
+
+        try:
+            for row in rows:
+                changed = self._apply(order, originals, changed, samples[row])
+                # Only the order the baseline was calculated on is locked, the others
+                # would be calculated as they were built
+                order.rebuild()
+                order.calculate()
+                prices[row] = order.price_curve()
+        finally:
+            self._apply(order, originals, changed, {})
+
+    @staticmethod
+    def _apply(order, originals, changed, delta):
+        '''
+        Puts back the participants that were changed for the previous sample but not for
+        this one, and replaces those changed by this sample
+
+        Returns:
+            set[str]: keys of the participants that differ from the source
+        '''
+        delta = {key.lstrip(':'): attributes for key, attributes in delta.items()}
+
+        for key in changed - delta.keys():
+            # The original still has its factory, it is not rebuilt
+            order.replace_participant_in_cache(originals[key])
+
+        for key, attributes in delta.items():
+            original = originals[key]
+            order.replace_participant_in_cache(
+                ParticipantRecord(original.constructor, {**original.attributes, **attributes})
+            )
+
+        return set(delta)
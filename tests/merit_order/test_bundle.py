@@ -0,0 +1,133 @@
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring
+
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from meurit.merit_order.bundle import (
+    BundleSource, InvalidBundleError, compile_source, open_source
+)
+from meurit.merit_order.curves import RubyCurve
+from meurit.merit_order.numpy_order import NumpyMeritOrder
+from meurit.merit_order.source import Source
+
+@pytest.fixture
+def source_dir(tmp_path):
+    path = tmp_path / 'dispatchable_config'
+    shutil.copytree('tests/fixtures/dispatchable_config', path)
+    return path
+
+@pytest.fixture
+def bundle(source_dir, tmp_path):
+    return compile_source(Source(source_dir), tmp_path / 'scenario.npz')
+
+def _without_curves(record):
+    return {key: value for key, value in record.items() if not isinstance(value, (Path, RubyCurve))}
+
+@pytest.mark.parametrize('config', ['dummy_config', 'dispatchable_config', 'flex_config'])
+def test_records_match_source(config, tmp_path):
+    source = Source(Path('tests/fixtures') / config)
+    bundled = BundleSource(compile_source(source, tmp_path / 'scenario.npz'))
+
+    for location in ('producers', 'users', 'interconnectors', 'flex'):
+        expected = list(getattr(source, location)())
+        records = list(getattr(bundled, location)())
+
+        assert [_without_curves(record) for record in records] == \
+            [_without_curves(record) for record in expected]
+        assert [sorted(record) for record in records] == [sorted(record) for record in expected]
+
+def test_curves_are_shared(bundle, source_dir):
+    bundled = BundleSource(bundle)
+    user = next(bundled.users())
+    producer = next(producer for producer in bundled.producers() if 'load_profile' in producer)
+
+    assert isinstance(user['load_profile'], RubyCurve)
+    assert user['load_profile'].ruby_class == 'Merit::LoadProfile'
+    np.testing.assert_array_equal(
+        user['load_profile'].values,
+        np.loadtxt(next(Source(source_dir).users())['load_profile'])
+    )
+
+    # Both refer to load_profiles/fake_curve.csv
+    assert producer['load_profile'] is user['load_profile']
+
+def test_keeps_path_of_source(bundle, source_dir):
+    assert BundleSource(bundle).path == source_dir
+
+def test_skips_unchanged_source(bundle, source_dir):
+    mtime = bundle.stat().st_mtime_ns
+
+    compile_source(Source(source_dir), bundle)
+
+    assert bundle.stat().st_mtime_ns == mtime
+
+def test_recompiles_changed_source(bundle, source_dir):
+    previous = BundleSource(bundle).hash
+
+    users = source_dir / 'demand.csv'
+    users.write_text(users.read_text().replace('1.5e11', '1.6e11'))
+    compile_source(Source(source_dir), bundle)
+
+    assert BundleSource(bundle).hash != previous
+
+def test_open_source(bundle, source_dir):
+    assert isinstance(open_source(bundle), BundleSource)
+    assert isinstance(open_source(source_dir), Source)
+
+def test_numpy_order_from_bundle(bundle, source_dir):
+    from_csv = NumpyMeritOrder.from_source(Source(source_dir))
+    from_bundle = NumpyMeritOrder.from_source(BundleSource(bundle))
+
+    from_csv.calculate()
+    from_bundle.calculate()
+
+    np.testing.assert_array_equal(from_bundle.price_curve(), from_csv.price_curve())
+    np.testing.assert_array_equal(from_bundle.demand_curve(), from_csv.demand_curve())
+
+def test_rejects_other_npz(tmp_path):
+    path = tmp_path / 'other.npz'
+    np.savez(path, values=np.zeros(3))
+
+    with pytest.raises(InvalidBundleError):
+        BundleSource(path)
+
+def test_keeps_booleans_with_empty_cells(source_dir, tmp_path):
+    (source_dir / 'interconnectors.csv').write_text(
+        'key,from_region,to_region,p_mw,scaling,in_service,marginal_costs\n'
+        'interconnector_nl_be,nl,be,700,1.0,False,10.0\n'
+        'interconnector_nl_de,nl,de,500,1.0,,20.0\n'
+        'interconnector_nl_dk,nl,dk,1400,1.0,True,\n'
+    )
+
+    source = Source(source_dir)
+    bundled = BundleSource(compile_source(source, tmp_path / 'scenario.npz'))
+
+    expected = [record.get('in_service') for record in source.interconnectors()]
+    in_service = [record.get('in_service') for record in bundled.interconnectors()]
+
+    assert expected == [False, None, True]
+    assert in_service == expected
+    assert all(isinstance(value, bool) for value in in_service if value is not None)
+
+def test_frame_matches_source(bundle, source_dir):
+    bundled = BundleSource(bundle)
+
+    for location in ('producers', 'users', 'interconnectors', 'flex'):
+        expected = Source(source_dir).frame(location)
+        frame = bundled.frame(location)
+        columns = [column for column in expected.columns if column not in ('load_profile', 'availability')]
+
+        assert list(frame.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(frame[columns], expected[columns], check_dtype=False)
+
+def test_does_not_keep_the_bundle_open(bundle):
+    source = BundleSource(bundle)
+
+    assert isinstance(source._arrays, dict)
+    # Still readable after the file is gone
+    bundle.unlink()
+    assert list(source.producers())
@@ -0,0 +1,162 @@
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring
+
+import getpass
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from meurit.merit_order.curve_cache import CurveCache
+
+@pytest.fixture
+def curve_file(tmp_path):
+    path = tmp_path / 'curve.csv'
+    path.write_text('1.0\n2.0\n3.0\n')
+    return path
+
+@pytest.fixture
+def cache(tmp_path):
+    return CurveCache(tmp_path / 'cache')
+
+def test_parses_once(cache, curve_file):
+    first = cache.get(curve_file)
+    second = cache.get(str(curve_file))
+
+    np.testing.assert_array_equal(first, [1.0, 2.0, 3.0])
+    assert second is first
+    assert not first.flags.writeable
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries, stats.bytes) == (1, 1, 1, 24)
+
+def test_reads_changed_file_again(cache, curve_file):
+    cache.get(curve_file)
+
+    curve_file.write_text('4.0\n5.0\n6.0\n')
+    os.utime(curve_file, ns=(0, curve_file.stat().st_mtime_ns + 1_000_000))
+
+    np.testing.assert_array_equal(cache.get(curve_file), [4.0, 5.0, 6.0])
+    assert cache.stats().misses == 2
+
+def test_reuses_files_of_earlier_cache(tmp_path, cache, curve_file):
+    cache.get(curve_file)
+
+    again = CurveCache(tmp_path / 'cache')
+    np.testing.assert_array_equal(again.get(curve_file), [1.0, 2.0, 3.0])
+    assert (again.stats().hits, again.stats().misses) == (1, 0)
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = CurveCache(tmp_path / 'cache', max_bytes=48)
+    paths = []
+
+    for index in range(3):
+        paths.append(tmp_path / f'curve_{index}.csv')
+        paths[-1].write_text(f'{index}\n{index}\n{index}\n')
+
+    cache.get(paths[0])
+    evicted = cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+
+    stats = cache.stats()
+    assert (stats.entries, stats.bytes, stats.evictions) == (2, 48, 1)
+    assert len(list((tmp_path / 'cache').glob('*.npy'))) == 2
+
+    # Arrays of evicted curves stay valid
+    np.testing.assert_array_equal(evicted, [1.0, 1.0, 1.0])
+
+    # The second curve was used least recently
+    cache.get(paths[0])
+    assert cache.stats().misses == 3
+
+    cache.get(paths[1])
+    assert cache.stats().misses == 4
+
+def test_ruby_curve_is_shared(cache, curve_file):
+    profile = cache.ruby_curve(curve_file, 'Merit::LoadProfile')
+
+    assert cache.ruby_curve(curve_file, 'Merit::LoadProfile') is profile
+    assert cache.ruby_curve(curve_file).ruby_class == 'Merit::Curve'
+    np.testing.assert_array_equal(profile.values, [1.0, 2.0, 3.0])
+
+def test_default_directory(tmp_path, monkeypatch):
+    monkeypatch.delenv('MEURIT_CURVE_CACHE', raising=False)
+    assert CurveCache().directory.name == f'meurit-curves-{getpass.getuser()}'
+
+    monkeypatch.setenv('MEURIT_CURVE_CACHE', str(tmp_path))
+    assert CurveCache().directory == tmp_path
+
+def test_file_removed_by_other_process(tmp_path, curve_file, monkeypatch):
+    cache = CurveCache(tmp_path / 'cache')
+    write = cache._write
+
+    def write_and_remove(npy_path, values):
+        write(npy_path, values)
+        npy_path.unlink()
+
+    monkeypatch.setattr(cache, '_write', write_and_remove)
+    values = cache.get(curve_file)
+
+    np.testing.assert_array_equal(values, [1.0, 2.0, 3.0])
+    assert not values.flags.writeable
+
+    # The removed file is parsed again by the next cache
+    again = CurveCache(tmp_path / 'cache')
+    np.testing.assert_array_equal(again.get(curve_file), [1.0, 2.0, 3.0])
+    assert again.stats().misses == 1
+
+def test_trims_files_of_earlier_runs(tmp_path):
+    paths = []
+
+    for index in range(4):
+        paths.append(tmp_path / f'curve_{index}.csv')
+        paths[-1].write_text(f'{index}\n{index}\n{index}\n')
+
+    CurveCache(tmp_path / 'cache').get(paths[0])
+    CurveCache(tmp_path / 'cache').get(paths[1])
+
+    file_size = next((tmp_path / 'cache').glob('*.npy')).stat().st_size
+    cache = CurveCache(tmp_path / 'cache', max_bytes=2 * file_size)
+
+    cache.get(paths[2])
+    cache.get(paths[3])
+
+    # Only the files of the last cache are left
+    assert len(list((tmp_path / 'cache').glob('*.npy'))) == 2
+    assert cache.stats().evictions == 0
+
+READ_CURVES = '''
+import sys
+import numpy as np
+from meurit.merit_order.curve_cache import CurveCache
+
+cache = CurveCache(sys.argv[1], max_bytes=int(sys.argv[2]))
+
+for _ in range(20):
+    for path in sys.argv[3:]:
+        index = float(path.rsplit('_', 1)[1].split('.')[0])
+        np.testing.assert_array_equal(cache.get(path), [index] * 3)
+'''
+
+def test_two_processes_share_directory(tmp_path):
+    paths = []
+
+    for index in range(10):
+        paths.append(str(tmp_path / f'curve_{index}.csv'))
+        Path(paths[-1]).write_text(f'{index}\n{index}\n{index}\n')
+
+    # Room for two curves, so the processes keep removing each other's files
+    max_bytes = 2 * 24
+    processes = [
+        subprocess.Popen([sys.executable, '-c', READ_CURVES, str(tmp_path / 'cache'), str(max_bytes), *order])
+        for order in (paths, paths[::-1])
+    ]
+
+    assert [process.wait(timeout=120) for process in processes] == [0, 0]
+
+    # Each process keeps the files of its own two curves at most
+    assert len(list((tmp_path / 'cache').glob('*.npy'))) <= 4
+    assert not list((tmp_path / 'cache').glob('*.partial'))
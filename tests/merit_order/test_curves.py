@@ -0,0 +1,43 @@
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring disable=protected-access
+
+import gc
+
+from meurit.merit_order.curves import RubyCurve
+
+class FakeContext():
+    '''Counts the curves sent to it, in place of a RubyContext'''
+    def __init__(self):
+        self.generation = 0
+        self.sent = 0
+
+    def evaluate_float64(self, code, data):
+        self.sent += 1
+        return (code, data)
+
+def test_proxy_for_sends_values_once_per_generation():
+    curve = RubyCurve([1.0, 2.0])
+    context = FakeContext()
+
+    assert curve.proxy_for(context) is curve.proxy_for(context)
+    assert context.sent == 1
+
+    context.generation += 1
+    curve.proxy_for(context)
+
+    assert context.sent == 2
+
+def test_proxy_for_forgets_collected_contexts():
+    curve = RubyCurve([1.0, 2.0])
+    context = FakeContext()
+    curve.proxy_for(context)
+
+    del context
+    gc.collect()
+
+    assert len(curve._proxies) == 0
+
+    # A new context never gets the proxy of a collected one, even when it has its id
+    context = FakeContext()
+    curve.proxy_for(context)
+
+    assert context.sent == 1
@@ -0,0 +1,47 @@
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring
+
+import numpy as np
+import pytest
+
+from meurit.merit_order.dispatchables import DispatchablesMatrix, first_available
+
+@pytest.fixture
+def matrix():
+    # Three dispatchables and four hours
+    return DispatchablesMatrix(
+        np.array(['cheap', 'medium', 'expensive']),
+        np.array([1.0, 5.0, 10.0]),
+        np.array([
+            [2.0, 3.0, 4.0],
+            [0.0, 3.0, 4.0],
+            [0.0, 0.0, 4.0],
+            [0.0, 0.0, 0.0],
+        ])
+    )
+
+def test_first_available(matrix):
+    result = first_available(matrix)
+
+    assert list(result.index) == [0, 1, 2, 2]
+    assert list(matrix.keys[result.index]) == ['cheap', 'medium', 'expensive', 'expensive']
+    assert list(result.available_capacity) == [2.0, 3.0, 4.0, 0.0]
+    assert list(result.marginal_costs) == [1.0, 5.0, 10.0, 10.0]
+
+def test_first_available_matches_hourly_lookup(matrix):
+    result = first_available(matrix)
+
+    for hour, capacities in enumerate(matrix.available_capacity):
+        # The same walk as MeritOrder.first_available_dispatchable_at
+        for index, capacity in enumerate(capacities):
+            if capacity:
+                break
+
+        assert result.index[hour] == index
+        assert result.available_capacity[hour] == capacity
+
+def test_first_available_without_dispatchables():
+    result = first_available(DispatchablesMatrix(np.array([], dtype=str), np.array([]), np.zeros((4, 0))))
+
+    assert list(result.index) == [-1] * 4
+    assert np.isnan(result.available_capacity).all()
+    assert np.isnan(result.marginal_costs).all()
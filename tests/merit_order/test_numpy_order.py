@@ -0,0 +1,149 @@
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from meurit.merit_order import MeritLockedException, MeritOrder, create_merit_order
+from meurit.merit_order.numpy_order import (
+    POINTS, MeritNotCalculatedException, NumpyMeritOrder, UnsupportedParticipantError
+)
+from meurit.merit_order.source import Source
+
+@pytest.fixture
+def source():
+    return Source(Path('tests/fixtures/dispatchable_config'))
+
+@pytest.fixture
+def order():
+    # Flat demand of 10 MW and 4 MW from a must run, leaving 6 MW for the dispatchables
+    mo = NumpyMeritOrder()
+    mo.add_user(key=':demand', load_curve=[10.0] * POINTS)
+    mo.add_participant('Merit::CurveProducer', key=':must_run', load_curve=[4.0] * POINTS)
+    mo.add_participant('Merit::DispatchableProducer', key=':expensive', marginal_costs=20.0,
+        output_capacity_per_unit=5.0, number_of_units=1.0)
+    mo.add_participant('Merit::DispatchableProducer', key=':cheap', marginal_costs=10.0,
+        output_capacity_per_unit=2.0, number_of_units=2.0, availability=0.5)
+
+    return mo
+
+def test_calculate(order):
+    order.calculate()
+
+    assert order.dispatchables_at(0) == [['cheap', 0.0, 10.0], ['expensive', 1.0, 20.0]]
+    np.testing.assert_array_equal(order.load_curve('cheap'), 2.0)
+    np.testing.assert_array_equal(order.load_curve(':expensive'), 4.0)
+    np.testing.assert_array_equal(order.demand_curve(), 10.0)
+
+    # The expensive dispatchable has capacity left and sets the price
+    np.testing.assert_array_equal(order.price_curve(), 20.0)
+
+def test_duplicate_key(order):
+    with pytest.raises(ValueError):
+        order.add_user(key=':demand', load_curve=[5.0] * POINTS)
+
+    assert len(order.cached_participants()) == 4
+
+def test_price_without_available_capacity(order):
+    order.add_user(key=':more_demand', load_curve=[10.0] * POINTS)
+    order.calculate()
+
+    # All capacity is used, the last dispatchable sets the price
+    assert order.dispatchables_at(0) == [['cheap', 0.0, 10.0], ['expensive', 0.0, 20.0]]
+    np.testing.assert_array_equal(order.price_curve(), 20.0)
+
+def test_recalculate_replaced_participant(order):
+    order.calculate()
+
+    with pytest.raises(MeritLockedException):
+        order.calculate(auto_build=False)
+
+    participant = order.get_participant_from_cache('cheap')
+    order.replace_participant_in_cache(order.replace_value(participant, 'number_of_units', 10.0))
+    order.calculate()
+
+    np.testing.assert_array_equal(order.load_curve('cheap'), 6.0)
+    np.testing.assert_array_equal(order.price_curve(), 10.0)
+
+def test_results_before_calculate(order):
+    with pytest.raises(MeritNotCalculatedException):
+        order.price_curve()
+
+def test_unsupported_participants():
+    mo = NumpyMeritOrder()
+
+    with pytest.raises(UnsupportedParticipantError):
+        mo.add_participant('Merit::Flex::Storage', key=':storage')
+
+    with pytest.raises(UnsupportedParticipantError):
+        mo.add_participant('Merit::VariableDispatchableProducer', key=':interconnector_import')
+
+    with pytest.raises(UnsupportedParticipantError):
+        mo.add_user(key=':share', consumption_share=0.5)
+
+    with pytest.raises(UnsupportedParticipantError):
+        NumpyMeritOrder.from_source(Source(Path('tests/fixtures/flex_config')))
+
+def test_from_source(source):
+    mo = NumpyMeritOrder.from_source(source)
+    mo.calculate()
+
+    assert len(mo.price_curve()) == POINTS
+    assert mo.dispatchables_at(0)[0][0] == 'energy_power_ultra_supercritical_coal'
+
+def test_create_merit_order():
+    assert isinstance(create_merit_order('numpy'), NumpyMeritOrder)
+
+    with pytest.raises(ValueError):
+        create_merit_order('fortran')
+
+def test_matches_merit_gem(source):
+    expected = MeritOrder.from_source(source)
+    expected.calculate()
+
+    actual = NumpyMeritOrder.from_source(source)
+    actual.calculate()
+
+    np.testing.assert_allclose(actual.demand_curve(), expected.demand_curve())
+
+    expected_matrix = expected.dispatchables_matrix()
+    actual_matrix = actual.dispatchables_matrix()
+
+    np.testing.assert_array_equal(actual_matrix.keys, expected_matrix.keys)
+    np.testing.assert_allclose(actual_matrix.marginal_costs, expected_matrix.marginal_costs)
+    np.testing.assert_allclose(
+        actual_matrix.available_capacity, expected_matrix.available_capacity, atol=1e-6
+    )
+
+    np.testing.assert_allclose(
+        actual.first_available_dispatchables().marginal_costs,
+        expected.first_available_dispatchables().marginal_costs
+    )
+
+    np.testing.assert_allclose(actual.price_curve(), expected.price_curve())
+
+    for participant in actual.cached_participants():
+        np.testing.assert_allclose(
+            actual.load_curve(participant.key), expected.load_curve(participant.key),
+            atol=1e-6, err_msg=participant.key
+        )
+
+def test_dispatchables_at_outside_the_year(order):
+    order.calculate()
+
+    # Nothing is dispatched past the end of the year, as in the Merit gem
+    assert order.dispatchables_at(POINTS + 10) == [['cheap', 2.0, 10.0], ['expensive', 5.0, 20.0]]
+
+    with pytest.raises(ValueError):
+        order.dispatchables_at(-1)
+
+def test_load_curves(order):
+    order.calculate()
+
+    blocks = list(order.load_curves(block_size=3))
+
+    assert [keys for keys, _ in blocks] == [['demand', 'must_run', 'expensive'], ['cheap']]
+    assert blocks[0][1].shape == (POINTS, 3)
+    np.testing.assert_array_equal(blocks[0][1][:, 2], order.load_curve('expensive'))
+    np.testing.assert_array_equal(blocks[1][1][:, 0], order.load_curve('cheap'))
@@ -0,0 +1,38 @@
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring disable=protected-access
+
+from pathlib import Path
+
+import numpy as np
+
+from meurit.merit_order.ruby import participant_payload
+
+def test_participant_payload():
+    class_name, method, attributes = participant_payload('Merit::User.create', {
+        'key': ':total_demand',
+        'load_profile': Path('tests/fixtures/dummy_config/load_profiles/fake_curve.csv'),
+        'total_consumption': np.float64(1000.0),
+        'number_of_units': np.int64(3),
+    })
+
+    assert class_name == 'Merit::User'
+    assert method == 'create'
+    assert attributes == {
+        'key': ':total_demand',
+        'load_profile': 'tests/fixtures/dummy_config/load_profiles/fake_curve.csv',
+        'total_consumption': 1000.0,
+        'number_of_units': 3,
+    }
+    assert type(attributes['number_of_units']) is int
+
+def test_participant_payload_uses_ruby_attribute_names():
+    _, _, attributes = participant_payload('Merit::VariableDispatchableProducer.new', {
+        'key': ':interconnector_import',
+        'availability_curve': 'tests/fixtures/dummy_config/availability_curves/fake.csv',
+        'consume_from_dispatchables': True,
+    })
+
+    assert attributes == {
+        'key': ':interconnector_import',
+        'availability': 'tests/fixtures/dummy_config/availability_curves/fake.csv',
+        'consume_from_dispatchables': True,
+    }
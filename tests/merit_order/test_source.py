@@ -109,3 +109,25 @@ def test_with_invalid_csvs():
 
     with pytest.raises(InvalidSourceError, match=r'could not be parsed'):
         next(producers)
+
+
+def test_reports_all_errors_at_once(tmp_path):
+    for location in ('demand.csv', 'flex.csv', 'interconnectors.csv'):
+        (tmp_path / location).write_text((Path('tests/fixtures/dummy_config') / location).read_text())
+
+    (tmp_path / 'supply.csv').write_text(
+        'key,type,path_to_load_profile,marginal_costs\n'
+        'plant_1,MustRunProducer,load_profiles/missing.csv,1.0\n'
+        ',DispatchableProducer,,2.0\n'
+        'plant_3,NuclearProducer,,3.0\n'
+        'plant_4,FusionProducer,,4.0\n'
+    )
+
+    with pytest.raises(InvalidSourceError) as error:
+        next(Source(tmp_path).producers())
+
+    message = str(error.value)
+
+    assert '"key" cannot be empty' in message
+    assert 'supply.csv: :plant_3, :plant_4' in message
+    assert 'load_profile could not be located' in message
@@ -0,0 +1,102 @@
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring
+
+import csv
+import multiprocessing
+import os
+import shutil
+import signal
+
+import numpy as np
+import pytest
+
+from meurit.batch import expand_sources, run_batch, run_scenario, scenario_name
+
+@pytest.fixture
+def sources(tmp_path):
+    folder = tmp_path / 'sources'
+
+    for config in ('dispatchable_config', 'flex_config'):
+        shutil.copytree(f'tests/fixtures/{config}', folder / config)
+
+    return folder
+
+def test_run_scenario(tmp_path):
+    build_seconds, calculate_seconds = run_scenario(
+        'tests/fixtures/dispatchable_config', tmp_path / 'out', backend='numpy'
+    )
+
+    assert build_seconds > 0 and calculate_seconds > 0
+    assert len(np.loadtxt(tmp_path / 'out' / 'price_curve.csv')) == 8760
+
+def test_expand_sources(sources):
+    expanded = expand_sources([sources / '*', sources / 'flex_config', 'missing'])
+
+    assert [path.name for path in expanded] == ['dispatchable_config', 'flex_config', 'missing']
+
+def test_scenario_name(tmp_path):
+    bundle = tmp_path / 'scenario.npz'
+    bundle.touch()
+
+    assert scenario_name(bundle) == 'scenario'
+    assert scenario_name(tmp_path / 'dispatchable_config') == 'dispatchable_config'
+
+def test_run_batch_continues_after_failure(sources, tmp_path):
+    seen = []
+    results = run_batch(
+        expand_sources([sources / '*', tmp_path / 'missing']), tmp_path / 'out',
+        workers=2, backend='numpy', on_result=seen.append
+    )
+
+    statuses = {result.name: result.status for result in results}
+
+    # The numpy backend does not do flex
+    assert statuses == {'dispatchable_config': 'ok', 'flex_config': 'failed', 'missing': 'failed'}
+    assert seen == results
+
+    assert (tmp_path / 'out' / 'dispatchable_config' / 'price_curve.csv').exists()
+    assert not (tmp_path / 'out' / 'flex_config').exists()
+
+    with open(tmp_path / 'out' / 'summary.csv') as summary_file:
+        rows = {row['name']: row for row in csv.DictReader(summary_file)}
+
+    assert rows.keys() == statuses.keys()
+    assert rows['missing']['error'].startswith('MissingSourceError')
+    assert float(rows['dispatchable_config']['seconds']) > 0
+
+def test_run_batch_needs_unique_names(sources, tmp_path):
+    shutil.copytree(sources / 'flex_config', tmp_path / 'flex_config')
+
+    with pytest.raises(ValueError):
+        run_batch([sources / 'flex_config', tmp_path / 'flex_config'], tmp_path / 'out', backend='numpy')
+
+def test_run_scenario_export(tmp_path):
+    run_scenario('tests/fixtures/dispatchable_config', tmp_path / 'out', backend='numpy', export='npy')
+
+    loads = np.load(tmp_path / 'out' / 'load_curves.npy')
+
+    assert loads.shape[0] == 8760
+    assert loads.shape[1] == len(np.genfromtxt(tmp_path / 'out' / 'participants.csv', delimiter=',', skip_header=1))
+    assert (tmp_path / 'out' / 'price_curve.csv').exists()
+
+def test_run_batch_recovers_from_dead_worker(tmp_path):
+    sources = []
+
+    for index in range(6):
+        sources.append(tmp_path / 'sources' / f'scenario_{index}')
+        shutil.copytree('tests/fixtures/dispatchable_config', sources[-1])
+
+    def kill_worker(result):
+        # Once, which breaks the pool and fails the scenarios left in it
+        if len(seen) == 1:
+            for worker in multiprocessing.active_children():
+                os.kill(worker.pid, signal.SIGKILL)
+
+    seen = []
+    results = run_batch(
+        sources, tmp_path / 'out', workers=1, backend='numpy',
+        on_result=lambda result: (seen.append(result), kill_worker(result))
+    )
+
+    # The scenarios left are run by a new pool
+    assert sorted(result.name for result in results) == [source.name for source in sources]
+    assert {result.status for result in results} == {'ok'}
@@ -0,0 +1,167 @@
+'''Tests for Country and Area'''
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from meurit.country import Area, Country, availability_curves
+from meurit.merit_order.curves import RubyCurve
+from meurit.merit_order.source import Source
+from vendor import rython
+
+@pytest.fixture
+def interconnectors():
+    return pd.DataFrame({
+        'key': ['interconnector_nl_be', 'interconnector_nl_de'],
+        'from_region': ['nl', 'nl'],
+        'to_region': ['be', 'de'],
+        'p_mw': [700, 500],
+        'scaling': [1.0, 1.0],
+        'in_service': [True, True],
+    })
+
+def test_availability_curves(interconnectors):
+    utilization = pd.DataFrame({0: [0.5, 0.25, 1.5], 1: [0.0, 0.1, 0.2]})
+    flows = pd.DataFrame({0: [350.0, -175.0, 0.0], 1: [0.0, -50.0, -100.0]})
+
+    nl = availability_curves(interconnectors, utilization, flows, 'nl')
+    be = availability_curves(interconnectors, utilization, flows, 'be')
+
+    # nl exports when the flow is positive, be imports then
+    np.testing.assert_array_equal(nl['interconnector_nl_be_export'], [0.5, 0.0, 1.0])
+    np.testing.assert_array_equal(nl['interconnector_nl_be_import'], [0.0, 0.25, 0.0])
+    np.testing.assert_array_equal(be['interconnector_nl_be_import'], [0.5, 0.0, 1.0])
+    np.testing.assert_array_equal(be['interconnector_nl_be_export'], [0.0, 0.25, 0.0])
+
+    np.testing.assert_array_equal(nl['interconnector_nl_de_import'], [0.0, 0.1, 0.2])
+
+    # be is not connected to de
+    assert 'interconnector_nl_de_import' not in be
+
+def test_area_run():
+    area = Area(max_iterations=3)
+    area.add_country(Source(Path('tests/fixtures/flex_config')), 'nl')
+    area.add_country(Source(Path('tests/fixtures/dummy_config')), 'be')
+
+    # Only the interconnector between the two countries is used
+    assert list(area.interconnectors().key) == ['interconnector_nl_be']
+
+    iterations = area.run()
+
+    assert 1 <= len(iterations) <= 3
+    assert [iteration.iteration for iteration in iterations] == list(range(1, len(iterations) + 1))
+    assert all(iteration.calculate_time > 0 for iteration in iterations)
+    assert area.utilization.shape == (8760, 1)
+    assert area.converged == (iterations[-1].residual <= area.tolerance)
+
+    for country in area.countries:
+        participant = country.merit_order.get_participant_from_cache('interconnector_nl_be_import')
+        assert isinstance(participant.attributes['availability'], RubyCurve)
+
+def test_area_prices_follow_final_utilization():
+    area = Area(max_iterations=2)
+    area.add_country(Source(Path('tests/fixtures/flex_config')), 'nl')
+    area.add_country(Source(Path('tests/fixtures/dummy_config')), 'be')
+
+    area.run()
+
+    for country in area.countries:
+        expected = Country(country.source, country.name)
+        expected.build_order()
+        expected.update_availability_curves(
+            availability_curves(area.interconnectors(), area.utilization, area.flows, country.name)
+        )
+        expected.calculate()
+
+        pd.testing.assert_series_equal(country.price_curve, expected.price_curve)
+
+@pytest.mark.parametrize('max_iterations', [1, 5])
+def test_area_calculates_after_last_injection(interconnectors, monkeypatch, max_iterations):
+    source = Source(Path('tests/fixtures/dispatchable_config'))
+    calls = []
+
+    calculate, inject = Country.calculate, Country.update_availability_curves
+    monkeypatch.setattr(Country, 'calculate', lambda self: (calls.append('calculate'), calculate(self)))
+    monkeypatch.setattr(
+        Country, 'update_availability_curves', lambda self, curves: (calls.append('inject'), inject(self, curves))
+    )
+
+    area = Area(interconnectors.iloc[:1], max_iterations=max_iterations)
+    area.add_country(source, 'nl', backend='numpy')
+    area.add_country(source, 'be', backend='numpy')
+
+    iterations = area.run()
+
+    # Whether it converged or ran out of iterations, both countries are calculated last
+    assert calls[-2:] == ['calculate', 'calculate']
+    assert calls.count('calculate') == 2 * (len(iterations) + 1)
+
+def test_area_without_interconnectors():
+    area = Area()
+    area.add_country(Source(Path('tests/fixtures/flex_config')), 'nl')
+
+    iterations = area.run()
+
+    assert len(iterations) == 1
+    assert area.converged
+
+def test_area_with_empty_interconnector_files():
+    # The interconnectors.csv of dispatchable_config only has a header
+    source = Source(Path('tests/fixtures/dispatchable_config'))
+
+    area = Area()
+    area.add_country(source, 'nl', backend='numpy')
+    area.add_country(source, 'be', backend='numpy')
+
+    assert area.interconnectors().empty
+    assert {'key', 'from_region', 'to_region'} <= set(area.interconnectors().columns)
+
+    iterations = area.run()
+
+    assert len(iterations) == 1
+    assert area.converged
+
+def test_area_unpins_its_contexts():
+    with rython.RubyContextPool(2, requires=['bundler/setup', 'quintel_merit']) as pool:
+        area = Area(pool=pool)
+        area.add_country(Source(Path('tests/fixtures/flex_config')), 'nl')
+        area.run()
+
+        # Nothing is pinned anymore, so the first context is the least busy again
+        assert pool.pin() is pool.contexts[0]
+
+def test_saturated_area_with_numpy_backend(interconnectors):
+    source = Source(Path('tests/fixtures/dispatchable_config'))
+
+    area = Area(interconnectors.iloc[:1], saturate=True, max_iterations=5)
+    area.add_country(source, 'nl', backend='numpy')
+    be = area.add_country(source, 'be', backend='numpy')
+
+    # be has less demand, so it is cheaper
+    demand = be.merit_order.get_participant_from_cache('total_demand')
+    be.merit_order.replace_participant_in_cache(
+        be.merit_order.replace_value(demand, 'total_consumption', 0.5e11)
+    )
+
+    area.run()
+
+    # be exports to nl, against the direction of the interconnector
+    assert (area.flows[0] <= 0).all()
+    assert (area.flows[0] < 0).any()
+    assert area.utilization[0].between(0.0, 1.0 + 1e-9).all()
+
+def test_available_plant_with_numpy_backend():
+    country = Country(Source(Path('tests/fixtures/dispatchable_config')), 'nl', backend='numpy')
+    country.build_order()
+    country.calculate()
+
+    plants = country.available_plant
+    matrix = country.merit_order.dispatchables_matrix()
+
+    assert plants.name == 'nl'
+    assert len(plants) == 8760
+    assert set(plants) <= set(matrix.keys)
+    assert plants[0] == matrix.keys[country.merit_order.first_available_dispatchables(matrix).index[0]]
@@ -0,0 +1,143 @@
+'''Tests for the ExchangeModel'''
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from meurit.exchange import ExchangeModel, exchange_zones
+from meurit.merit_order.dispatchables import DispatchablesMatrix
+
+Zone = namedtuple('Zone', ['name', 'price_curve', 'available_capacity', 'available_plant'])
+StackedZone = namedtuple('StackedZone', ['name', 'supply_stack'])
+
+@pytest.fixture
+def model():
+    return ExchangeModel(pd.DataFrame({
+        'key': ['nl_be', 'nl_de', 'be_de'],
+        'from_region': ['nl', 'nl', 'be'],
+        'to_region': ['be', 'de', 'de'],
+        'p_mw': [100.0, 200.0, 0.0],
+        'scaling': [1.0, 0.5, 1.0],
+        'in_service': [True, True, True],
+    }))
+
+@pytest.fixture
+def zones():
+    # Two hours: nl is expensive in the first, cheap in the second
+    def zone(name, prices, surplus):
+        return Zone(name, pd.Series(prices), pd.Series(surplus), pd.Series(['plant'] * 2))
+
+    return [
+        zone('nl', [50.0, 10.0], [20.0, 500.0]),
+        zone('be', [40.0, 30.0], [30.0, 40.0]),
+        zone('de', [20.0, 40.0], [300.0, 300.0]),
+    ]
+
+def test_plan(model):
+    plan = model.plan
+
+    assert plan.regions == ['be', 'de', 'nl']
+    np.testing.assert_array_equal(plan.from_index, [2, 2, 0])
+    np.testing.assert_array_equal(plan.to_index, [0, 1, 1])
+    # be_de has no capacity
+    np.testing.assert_array_equal(plan.active, [True, True, False])
+
+def test_cheaper_zone_exports(model):
+    plan = model.plan
+
+    # Over nl_de, nl is 30 more expensive in the first hour and 30 cheaper in the second
+    exporting, importing = exchange_zones(plan, np.array([1, 1]), np.array([30.0, -30.0]))
+
+    assert [plan.regions[index] for index in exporting] == ['de', 'nl']
+    assert [plan.regions[index] for index in importing] == ['nl', 'de']
+
+def test_exchange_table(model, zones):
+    utilization = pd.DataFrame(0.0, index=range(2), columns=model.interconnectors.index)
+    table = model.make_exchange_table(zones, utilization)
+
+    assert list(table.node) == [1, 1]
+    # The cheaper zone exports
+    assert list(table.exporting_zone) == ['de', 'nl']
+    assert list(table.importing_zone) == ['nl', 'de']
+    assert list(table.available_mw) == [100.0, 100.0]
+    assert list(table.welfare_per_unit) == [30.0, 30.0]
+
+def test_exchange_energy(model, zones):
+    utilization = pd.DataFrame(0.0, index=range(2), columns=model.interconnectors.index)
+    prices, utilization = model.exchange_energy(zones, utilization)
+
+    # de exports in the first hour, nl in the second, both limited by capacity
+    np.testing.assert_allclose(utilization[1], [0.5, 0.5])
+    np.testing.assert_allclose(utilization[[0, 2]], 0.0)
+    np.testing.assert_allclose(model.flows[1], [-100.0, 100.0])
+
+    np.testing.assert_allclose(prices, [[40.0, 20.0, 20.0], [10.0, 10.0, 30.0]])
+
+    # nl_de is full, now be exports its surplus in the first hour, nl in the second
+    _, utilization = model.exchange_energy(zones, utilization)
+    np.testing.assert_allclose(utilization[0], [0.3, 1.0])
+    np.testing.assert_allclose(model.flows[0], [-30.0, 100.0])
+
+@pytest.fixture
+def stacked_zones():
+    # Two hours, in the first a is cheap, in the second b is
+    def zone(name, load):
+        stack = DispatchablesMatrix(
+            np.array([f'{name}_cheap', f'{name}_expensive']),
+            np.array({'a': [10.0, 30.0], 'b': [20.0, 50.0]}[name]),
+            100.0 - np.array(load),
+            np.array(load)
+        )
+        return StackedZone(name, stack)
+
+    return [zone('a', [[50.0, 0.0], [100.0, 50.0]]), zone('b', [[100.0, 80.0], [20.0, 0.0]])]
+
+def saturating_model(**kwargs):
+    return ExchangeModel(pd.DataFrame({
+        'key': ['a_b'], 'from_region': ['a'], 'to_region': ['b'],
+        'p_mw': [100.0], 'scaling': [1.0], 'in_service': [True],
+    }), saturate=True, **kwargs)
+
+def test_saturate_exchange(stacked_zones):
+    model = saturating_model()
+    utilization = pd.DataFrame(0.0, index=range(2), columns=[0])
+
+    prices, utilization = model.exchange_energy(stacked_zones, utilization)
+
+    # In the first hour a exports 50 on its cheap and 30 on its expensive dispatchable,
+    # until it costs more than what b saves. In the second hour b exports 50.
+    np.testing.assert_allclose(model.flows[0], [80.0, -50.0])
+    np.testing.assert_allclose(utilization[0], [0.8, 0.5])
+    np.testing.assert_allclose(prices[0], [30.0, 20.0])
+
+def test_saturate_exchange_with_threshold(stacked_zones):
+    model = saturating_model(welfare_threshold=25.0)
+    utilization = pd.DataFrame(0.0, index=range(2), columns=[0])
+
+    _, utilization = model.exchange_energy(stacked_zones, utilization)
+
+    # Only the first 50 in the first hour gain more than 25 per unit
+    np.testing.assert_allclose(model.flows[0], [50.0, 0.0])
+
+def test_saturate_exchange_warns_when_stopped_early(stacked_zones, capsys):
+    model = saturating_model(max_rounds=1)
+    model.exchange_energy(stacked_zones, pd.DataFrame(0.0, index=range(2), columns=[0]))
+
+    assert 'stopped after 1 rounds' in capsys.readouterr().out
+
+    # Saturated within the default number of rounds, nothing is printed
+    saturating_model().exchange_energy(stacked_zones, pd.DataFrame(0.0, index=range(2), columns=[0]))
+
+    assert capsys.readouterr().out == ''
+
+def test_saturate_exchange_without_stacks(zones):
+    model = saturating_model()
+
+    with pytest.raises(ValueError):
+        model.exchange_energy(
+            [Zone('a', *zones[0][1:]), Zone('b', *zones[1][1:])],
+            pd.DataFrame(0.0, index=range(2), columns=[0])
+        )
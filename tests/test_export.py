@@ -0,0 +1,58 @@
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from meurit.export import export_results
+from meurit.merit_order import create_merit_order
+from meurit.merit_order.builder import MeritOrderBuilder
+from meurit.merit_order.source import Source
+
+@pytest.fixture
+def order():
+    mo = create_merit_order('numpy')
+    MeritOrderBuilder(mo, Source(Path('tests/fixtures/dispatchable_config'))).build_from_source()
+    mo.calculate()
+
+    return mo
+
+def expected_loads(order):
+    keys = [participant.key.lstrip(':') for participant in order.cached_participants()]
+    return keys, np.column_stack([order.load_curve(key) for key in keys])
+
+def test_export_npy(order, tmp_path):
+    path = export_results(order, tmp_path / 'out', 'npy', block_size=2)
+    keys, loads = expected_loads(order)
+
+    assert path == tmp_path / 'out' / 'load_curves.npy'
+    np.testing.assert_array_equal(np.load(path), loads)
+    assert pd.read_csv(tmp_path / 'out' / 'participants.csv')['key'].tolist() == keys
+    np.testing.assert_array_equal(np.loadtxt(tmp_path / 'out' / 'price_curve.csv'), order.price_curve())
+
+def test_export_csv(order, tmp_path):
+    path = export_results(order, tmp_path, 'csv')
+    keys, loads = expected_loads(order)
+
+    frame = pd.read_csv(path)
+
+    assert frame.columns.tolist() == keys
+    np.testing.assert_allclose(frame.to_numpy(), loads)
+    assert not (tmp_path / 'load_curves.npy').exists()
+
+def test_export_parquet(order, tmp_path):
+    pytest.importorskip('pyarrow')
+
+    path = export_results(order, tmp_path, 'parquet')
+    keys, loads = expected_loads(order)
+
+    frame = pd.read_parquet(path)
+
+    assert frame.columns.tolist() == keys
+    np.testing.assert_array_equal(frame.to_numpy(), loads)
+
+def test_export_unknown_format(order, tmp_path):
+    with pytest.raises(ValueError):
+        export_results(order, tmp_path, 'xlsx')
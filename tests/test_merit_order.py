@@ -1,12 +1,15 @@
 '''Tests for MeritOrder'''
 # pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring disable=invalid-name
 
-import re
+import numpy as np
 import pytest
 from pathlib import Path
+from xmlrpc.client import Fault
 
 from meurit.merit_order import MeritLockedException, MeritOrder, convert_to_ruby_hash_string, participants
+from meurit.merit_order.curves import RubyCurve
 from meurit.merit_order.source import Source
+from vendor import rython
 
 @pytest.fixture
 def must_run_values():
@@ -43,6 +46,48 @@ def test_add_user():
     assert mo.merit_order("participants")("first")("to_s") == f'#<Merit::User::TotalConsumption {user_values["key"][1:]}>'
 
 
+def test_add_participants_in_batch(must_run_values):
+    mo = MeritOrder()
+
+    with mo.batch():
+        mo.add_participant(participant='Merit::MustRunProducer', **must_run_values)
+        mo.add_user(key=':total_demand', total_consumption=1000.0,
+            load_profile='tests/fixtures/dummy_config/load_profiles/fake_curve.csv')
+
+        # Nothing is sent to Ruby before the batch is done
+        assert mo.merit_order("to_s") == '#<Merit::Order (0 producers, 0 users, 0 flex, 0 price-sensitives)>'
+
+    assert mo.merit_order("to_s") == '#<Merit::Order (1 producers, 1 users, 0 flex, 0 price-sensitives)>'
+    assert len(mo.cached_participants()) == 2
+
+
+def test_failed_batch_is_not_cached(must_run_values):
+    mo = MeritOrder()
+
+    with pytest.raises(Fault):
+        with mo.batch():
+            mo.add_participant(participant='Merit::MustRunProducer', **must_run_values)
+            mo.add_participant(participant='Merit::UnknownProducer', key=':unknown')
+
+    assert mo.cached_participants() == []
+
+    # The next rebuild does not replay the failed batch
+    mo.rebuild()
+    assert mo.merit_order("to_s") == '#<Merit::Order (0 producers, 0 users, 0 flex, 0 price-sensitives)>'
+
+
+def test_duplicate_key_in_batch(must_run_values):
+    mo = MeritOrder()
+
+    with pytest.raises(ValueError):
+        with mo.batch():
+            mo.add_participant(participant='Merit::MustRunProducer', **must_run_values)
+            mo.add_participant(participant='Merit::MustRunProducer', **must_run_values)
+
+    # Nothing was sent to Ruby
+    assert mo.merit_order("to_s") == '#<Merit::Order (0 producers, 0 users, 0 flex, 0 price-sensitives)>'
+
+
 def test_add_interconnector_with_curve():
     attrs = {
         'key': 'interconnector',
@@ -71,9 +116,33 @@ def test_calculate_and_price_curve(must_run_values):
 
     mo.calculate()
     pc = mo.price_curve()
-    assert isinstance(pc, list)
+    assert isinstance(pc, np.ndarray)
+    assert pc.dtype == np.float64
     assert len(pc) == 8760
 
+    # Through a memory mapped file
+    mo.curve_transfer = 'file'
+    assert np.array_equal(mo.price_curve(), pc)
+
+def test_load_and_demand_curves():
+    mo = MeritOrder.from_source(Source(Path('tests/fixtures/flex_config')))
+    mo.calculate()
+
+    demand = mo.demand_curve()
+    assert demand.shape == (8760,)
+    assert np.allclose(demand, mo.load_curve('total_demand'))
+
+    load = mo.load_curve(':interconnector_nl_be_import')
+    assert load.shape == (8760,)
+
+def test_load_curve_key_is_not_evaluated():
+    mo = MeritOrder.from_source(Source(Path('tests/fixtures/flex_config')))
+    mo.calculate()
+
+    # The key is passed to Ruby as a value, no participant has it
+    with pytest.raises(Exception, match="undefined method `load_curve' for nil"):
+        mo.load_curve("total_demand' + \"#{raise 'evaluated'}")
+
 def test_dispatchables():
     mo = MeritOrder.from_source(Source(Path('tests/fixtures/flex_config')))
 
@@ -107,6 +176,19 @@ def test_dispatchables_at_with_out_of_bounds_time():
     assert dispatchables[0][0] == 'flex_1'
     assert dispatchables[0][1] == 2.0
 
+def test_dispatchables_matrix():
+    mo = MeritOrder.from_source(Source(Path('tests/fixtures/flex_config')))
+
+    mo.calculate()
+
+    matrix = mo.dispatchables_matrix()
+    dispatchables = mo.dispatchables_at(300)
+
+    assert matrix.available_capacity.shape == (8760, len(dispatchables))
+    assert list(matrix.keys) == [key for key, _, _ in dispatchables]
+    assert list(matrix.marginal_costs) == [costs for _, _, costs in dispatchables]
+    assert list(matrix.available_capacity[300]) == [capacity for _, capacity, _ in dispatchables]
+
 def test_first_available_dispatchable():
     mo = MeritOrder.from_source(Source(Path('tests/fixtures/flex_config')))
 
@@ -130,6 +212,12 @@ def test_inject_curve_into_interconnector():
 
     # Inject availability
     mo.inject_curve('interconnector_nl_be_import', [0.0]*8760)
+
+    # The values are sent to Ruby as a curve, the participant only refers to it
+    participant = mo.get_participant_from_cache('interconnector_nl_be_import')
+    assert isinstance(participant.attributes['availability'], RubyCurve)
+    assert '0.0, 0.0' not in participant.to_ruby()
+
     mo.calculate()
 
     # Test changes
@@ -148,7 +236,7 @@ def test_rebuild():
 
     # Change the cheapest interconnectors marginal costs
     participant = mo.get_participant_from_cache('interconnector_nl_be_import')
-    participant = re.sub(r'marginal_costs: (\.|[\da-zA-Z])+,', 'marginal_costs: 50.0,', participant)
+    participant = mo.replace_value(participant, 'marginal_costs', 50.0)
 
     # Make sure the lock works!
     with pytest.raises(MeritLockedException):
@@ -158,7 +246,41 @@ def test_rebuild():
     mo.replace_participant_in_cache(participant)
     mo.calculate()
 
+    # Only the replaced participant was evaluated again
+    assert mo.rebuilt_participants == 1
+
     # Now the cheapest interconnector should be another one in Merit
     dispatchables = mo.dispatchables_at(300)
     assert dispatchables[2][0] != 'interconnector_nl_be_import'
     assert dispatchables[2][0] == 'interconnector_nl_de_import'
+
+@pytest.fixture
+def pool():
+    with rython.RubyContextPool(2, max_jobs=1, requires=['bundler/setup', 'quintel_merit']) as pool:
+        yield pool
+
+def test_calculate_all_in_pool(pool):
+    source = Source(Path('tests/fixtures/flex_config'))
+    orders = [MeritOrder.from_source(source, pool.pin()) for _ in range(2)]
+
+    # Each order lives in its own Ruby process
+    assert orders[0].context is not orders[1].context
+
+    MeritOrder.calculate_all(orders, pool)
+
+    np.testing.assert_array_equal(orders[0].price_curve(), orders[1].price_curve())
+
+def test_recycled_context_rebuilds_order(pool):
+    mo = MeritOrder.from_source(Source(Path('tests/fixtures/flex_config')), pool.pin())
+    mo.inject_curve('interconnector_nl_be_import', np.zeros(8760))
+    generation = mo.context.generation
+
+    MeritOrder.calculate_all([mo], pool)
+    prices = mo.price_curve()
+
+    # With max_jobs=1 the context is restarted before the second job
+    MeritOrder.calculate_all([mo], pool)
+
+    assert mo.context.generation == generation + 1
+    assert mo.rebuilt_participants == len(mo.cached_participants())
+    np.testing.assert_array_equal(mo.price_curve(), prices)
@@ -0,0 +1,236 @@
+'''Tests for the Ruby bridge in vendor/rython'''
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring
+
+import gc
+import math
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from xmlrpc.client import Fault
+
+import pytest
+
+from vendor import rython
+
+@pytest.fixture(params=['xmlrpc', 'framed'])
+def context(request):
+    ctx = rython.RubyContext(transport=request.param, requires=[])
+    yield ctx
+    ctx.unload()
+
+def test_nan_and_infinity_in_arguments(context):
+    describe = context.prepare('[values.map(&:to_s), options.values.map(&:to_s)]', 'values', 'options')
+
+    # Lists of only floats travel as raw buffers, mixed ones and dicts as JSON
+    assert describe(['a', math.nan], {'low': -math.inf}) == [['a', 'NaN'], ['-Infinity']]
+
+def test_reload_after_ruby_died(context):
+    assert not context.is_alive()
+
+    pid = context('Process.pid')
+    assert context.is_alive()
+
+    os.kill(pid, signal.SIGKILL)
+
+    while context.is_alive():
+        time.sleep(0.01)
+
+    context.reload()
+
+    assert context('Process.pid') != pid
+
+def test_calling_site(context):
+    class Order:
+        def __init__(self, context):
+            self.context = context
+
+        @rython.calling_site
+        def pid(self):
+            return self.context('Process.pid')
+
+    context.enable_stats()
+    Order(context).pid()
+
+    assert context.stats()['Order.pid']['calls'] == 1
+
+def test_items_are_returned_one_by_one(context):
+    # As the factories of the participants of a Merit order are
+    number, proxy, missing = context('Rython::Items.new([1.5, Object.new, nil])')
+
+    assert number == 1.5
+    assert isinstance(proxy, rython.RubyProxy)
+    assert proxy('self.class.name') == 'Object'
+    assert missing is None
+
+def test_spawn_does_not_leak_descriptors(context):
+    context.load()
+    context.unload()
+    before = len(os.listdir('/proc/self/fd'))
+
+    for _ in range(3):
+        context.load()
+        context.unload()
+
+    assert len(os.listdir('/proc/self/fd')) == before
+
+@pytest.fixture
+def socket_path(tmp_path):
+    path = str(tmp_path / 'daemon.sock')
+    yield path
+
+    # Stop a daemon a test left running
+    daemon = rython.RubyContext(transport='framed', daemon=True, requires=[], socket_path=path)
+    daemon.stop_daemon()
+
+def _daemon_context(socket_path):
+    return rython.RubyContext(transport='framed', daemon=True, requires=[], socket_path=socket_path)
+
+def test_daemon_contexts_have_their_own_namespace(socket_path):
+    first, second = _daemon_context(socket_path), _daemon_context(socket_path)
+
+    try:
+        kept = first('Object.new')
+
+        # One Ruby process, each context with its own objects
+        assert first('Process.pid') == second('Process.pid')
+        assert first.namespace != second.namespace
+        assert first.registry_size() > second.registry_size()
+
+        with pytest.raises(Fault):
+            second.evaluate_on_instance(kept.ruby_context_address, 'self')
+    finally:
+        first.unload()
+        second.unload()
+
+    # Detaching leaves the daemon running for others
+    third = _daemon_context(socket_path)
+    assert third('1 + 1') == 2
+    third.unload()
+
+def test_daemon_replaces_stale_socket(socket_path):
+    # A socket file left behind by a daemon that died, nothing listens on it
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+
+    context = _daemon_context(socket_path)
+
+    assert context('1 + 1') == 2
+    context.unload()
+
+def test_daemon_outlives_its_parent(socket_path):
+    script = (
+        'import sys; sys.path.insert(0, ".")\n'
+        'from vendor import rython\n'
+        f'context = rython.RubyContext(transport="framed", daemon=True, requires=[], socket_path={socket_path!r})\n'
+        'print(context("Process.pid"))\n'
+    )
+    pid = int(subprocess.run(
+        [sys.executable, '-c', script], check=True, capture_output=True, text=True
+    ).stdout)
+
+    # The Python process is gone, the daemon still runs and takes new contexts
+    os.kill(pid, 0)
+
+    context = _daemon_context(socket_path)
+    assert context('Process.pid') == pid
+    context.unload()
+
+def test_registry_stays_flat(context):
+    assert context.release_batch == 100
+    empty = context.registry_size()
+    sizes = []
+
+    for call in range(1, 301):
+        # Each proxy is collected at once, its release waits for the next batch
+        context('Object.new')
+
+        if call % 100 == 0:
+            sizes.append(context.registry_size())
+
+    assert all(size <= empty + context.release_batch for size in sizes)
+
+    context.release_proxies()
+    assert context.registry_size() == empty
+
+def test_proxy_handed_out_twice_survives_one_release(context):
+    empty = context.registry_size()
+    context('$kept = Object.new; nil')
+
+    first = context('$kept')
+    del first
+    gc.collect()
+
+    # Ruby hands the object out again before the release of the first proxy is sent
+    second = context('$kept')
+    context.release_proxies()
+
+    assert second('self.equal?($kept)') is True
+    assert context.registry_size() == empty + 1
+
+    del second
+    gc.collect()
+    context.release_proxies()
+
+    assert context.registry_size() == empty
+
+def test_snippet_is_compiled_again_after_restart(context):
+    double = context.prepare('value * 2', 'value')
+    context.enable_stats()
+
+    assert double(2) == 4
+    assert double(3) == 6
+    compiled_in = context.generation
+
+    context.reload()
+
+    # The lambda of the earlier Ruby process is gone, it is compiled once more
+    assert double(4) == 8
+    assert context.generation == compiled_in + 1
+    assert double._compiled[0] == context.generation
+
+    methods = context.stats()['unattributed']['methods']
+    assert methods['prepare'] == 2
+    assert methods['invoke'] == 3
+
+def test_invoke_with_stale_handle(context):
+    double = context.prepare('value * 2', 'value')
+    assert double(2) == 4
+
+    # A handle of this generation whose lambda Ruby no longer has
+    released = double._compiled[1].ruby_context_address.replace(']', '0]')
+    double._compiled = (context.generation, rython.RubyProxy(context, released))
+
+    with pytest.raises(Fault, match='no snippet exists'):
+        double(2)
+
+    # A handle of an earlier generation is never sent, the snippet is compiled again
+    double._compiled = (context.generation - 1, double._compiled[1])
+    assert double(5) == 10
+
+def test_failing_call_under_stats(context):
+    class Order:
+        def __init__(self, context):
+            self.context = context
+
+        @rython.calling_site
+        def fail(self):
+            return self.context('raise "boom"')
+
+    with pytest.raises(Fault) as plain:
+        Order(context).fail()
+
+    context.enable_stats()
+
+    with pytest.raises(Fault) as timed:
+        Order(context).fail()
+
+    # The error names the method that failed, not the timing around it
+    assert str(timed.value) == str(plain.value)
+    assert 'timed' not in str(timed.value)
+
+    entry = context.stats()['Order.fail']
+    assert (entry['calls'], entry['errors'], entry['methods']) == (1, 1, {'evaluate': 1})
@@ -0,0 +1,82 @@
+# pylint: disable=import-error disable=redefined-outer-name disable=missing-function-docstring
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from meurit.merit_order import NumpyMeritOrder
+from meurit.merit_order.source import Source
+from meurit.sweep import Sweep, sample_parameters
+from vendor import rython
+
+COAL = 'energy_power_ultra_supercritical_coal'
+GAS = 'energy_power_combined_cycle_network_gas'
+
+@pytest.fixture
+def source():
+    return Source(Path('tests/fixtures/dispatchable_config'))
+
+def test_sample_parameters_is_seeded():
+    distributions = {
+        (COAL, 'marginal_costs'): (40.0, 50.0),
+        (GAS, 'availability'): lambda rng, samples: rng.normal(0.9, 0.01, samples),
+    }
+
+    samples = sample_parameters(distributions, 5, seed=3)
+
+    assert samples == sample_parameters(distributions, 5, seed=3)
+    assert samples != sample_parameters(distributions, 5, seed=4)
+    assert len(samples) == 5
+    assert all(40.0 <= sample[COAL]['marginal_costs'] <= 50.0 for sample in samples)
+    assert all(sample[GAS].keys() == {'availability'} for sample in samples)
+
+def _price_curve(source, delta):
+    order = NumpyMeritOrder.from_source(source)
+
+    for key, attributes in delta.items():
+        participant = order.get_participant_from_cache(key)
+        for attribute, value in attributes.items():
+            participant.attributes[attribute] = value
+
+    order.calculate()
+    return order.price_curve()
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_run_matches_fresh_orders(source, workers):
+    sweep = Sweep(source, backend='numpy', workers=workers)
+    samples = [
+        {COAL: {'marginal_costs': 70.0}},
+        {},
+        {':' + GAS: {'number_of_units': 0.0}, COAL: {'availability': 0.1}},
+        {COAL: {'number_of_units': 0.0}},
+    ]
+
+    prices = sweep.run(samples)
+
+    assert prices.shape == (4, 8760)
+
+    for row, sample in zip(prices, samples):
+        np.testing.assert_array_equal(row, _price_curve(source, sample))
+
+    np.testing.assert_array_equal(prices[1], sweep.baseline)
+
+def test_run_puts_back_the_source(source):
+    sweep = Sweep(source, backend='numpy')
+    sweep.run([{COAL: {'marginal_costs': 70.0}}])
+
+    assert sweep.orders[0].get_participant_from_cache(COAL).attributes['marginal_costs'] == 45.0
+
+def test_run_unknown_participant(source):
+    with pytest.raises(KeyError):
+        Sweep(source, backend='numpy').run([{'unknown': {'marginal_costs': 1.0}}])
+
+def test_run_in_pool_applies_first_sample(source):
+    with rython.RubyContextPool(2, requires=['bundler/setup', 'quintel_merit']) as pool:
+        sweep = Sweep(source, pool=pool)
+        prices = sweep.run([{COAL: {'number_of_units': 0.0}}] * 2)
+
+    # Each row is the first sample of its own order
+    np.testing.assert_array_equal(prices[0], prices[1])
+    np.testing.assert_array_equal(prices[1], _price_curve(source, {COAL: {'number_of_units': 0.0}}))
+    assert (prices[1] != sweep.baseline).any()